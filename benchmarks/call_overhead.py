@@ -0,0 +1,46 @@
+"""
+Microbenchmark of the client side cost of one RPC call, with the network taken out.
+
+Compares the previous request path (payload dict, list concatenation, uuid4 id, json.dumps of the whole payload)
+with PirateWallet.call, both posting to a transport that answers instantly with a canned response.
+
+Usage:
+    PYTHONPATH=. python benchmarks/call_overhead.py [calls]
+"""
+
+import sys
+from json import dumps, loads
+from timeit import timeit
+from uuid import uuid4
+
+from pirate_chain_py import PirateWallet
+
+RESPONSE = b'{"result": 1.25, "error": null, "id": 1}'
+
+
+class NullTransport:
+    def post(self, body: bytes):
+        return RESPONSE
+
+
+def legacy_z_get_balance(wallet, address, args=None):
+    if args is None: args = []
+    if not isinstance(args, list): raise TypeError
+    payload = {'method': 'z_getbalance', 'params': [address] + args}
+    if payload.get('jsonrpc', None) is None: payload['jsonrpc'] = '1.0'
+    if payload.get('id', None) is None: payload['id'] = str(uuid4())
+    return loads(wallet.transport.post(dumps(payload).encode('utf-8')))
+
+
+if __name__ == '__main__':
+    calls = int(sys.argv[1]) if len(sys.argv) > 1 else 200000
+    pw = PirateWallet(ip='127.0.0.1', port='45453', username='user', password='pass', transport=NullTransport())
+    address = 'zs1' + 'q' * 75
+
+    legacy = min(timeit(lambda: legacy_z_get_balance(pw, address, [1]), number=calls) for _ in range(3))
+    wrapped = min(timeit(lambda: pw.z_get_balance(address, [1]), number=calls) for _ in range(3))
+    generic = min(timeit(lambda: pw.call('z_getbalance', address, 1), number=calls) for _ in range(3))
+
+    for name, total in (('legacy payload path', legacy), ('z_get_balance()', wrapped), ('call()', generic)):
+        print(f'{name:<22} {total / calls * 1e6:7.2f} us/call   {calls / total:10.0f} calls/s')
+    print(f'overhead drop: {(1 - generic / legacy) * 100:.0f}% (call), {(1 - wrapped / legacy) * 100:.0f}% (wrapped method)')
@@ -0,0 +1,37 @@
+"""
+Measures the cold import time of `from pirate_chain_py import PirateWallet` in a fresh interpreter.
+
+Usage:
+    python benchmarks/import_time.py [budget_ms]
+
+Exits with status 1 when the cumulative import time of the package exceeds the budget.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+IMPORT_BUDGET_MS = 10.0
+RUNS = 7
+
+
+def measure():
+    """
+    Runs `python -X importtime` once and reads the cumulative time of the top level package import,
+    which includes every module it pulls in that the interpreter had not loaded already.
+    :return: import time in milliseconds
+    """
+    out = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'from pirate_chain_py import PirateWallet'],
+                         cwd=Path(__file__).resolve().parent.parent, stderr=subprocess.PIPE, universal_newlines=True, check=True).stderr
+    for line in out.splitlines():
+        _self, cumulative, name = line[len('import time:'):].split('|')
+        if name.rstrip() == ' pirate_chain_py':
+            return int(cumulative) / 1000
+    raise RuntimeError('pirate_chain_py import not found in -X importtime output')
+
+
+if __name__ == '__main__':
+    budget = float(sys.argv[1]) if len(sys.argv) > 1 else IMPORT_BUDGET_MS
+    best = min(measure() for _ in range(RUNS))
+    print(f'import pirate_chain_py: {best:.2f} ms (best of {RUNS}), budget {budget:.2f} ms')
+    sys.exit(0 if best <= budget else 1)
@@ -0,0 +1,5 @@
+import sys
+
+from pirate_chain_py.cli import main
+
+sys.exit(main())
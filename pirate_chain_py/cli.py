@@ -0,0 +1,240 @@
+"""
+`pirate-rpc`: run NDJSON method calls against a node and stream NDJSON results.
+
+Every input line is one call:
+    {"method": "z_validateaddress", "params": ["zs1..."], "id": "optional, echoed back"}
+Every output line is one result, in input order:
+    {"id": ..., "result": ..., "error": ...}
+
+Usage:
+    pirate-rpc [--conf ~/.komodo/PIRATE/PIRATE.conf] [-c 8] [-b 50] [calls.ndjson] > results.ndjson
+"""
+
+import os
+import sys
+import threading
+import time
+from collections import deque
+from itertools import islice
+from json import dumps, loads
+
+from pirate_chain_py.transport import HttpStatusError
+
+DEFAULT_CONF = os.path.join('~', '.komodo', 'PIRATE', 'PIRATE.conf')
+DEFAULT_PORT = '45453'
+
+
+def read_conf(path: str):
+    """
+    Reads rpcuser, rpcpassword and rpcport from a PIRATE.conf file.
+    :param path: Config file path, `~` is expanded.
+    :return: dict of the key=value pairs in the file
+    """
+    conf = {}
+    with open(os.path.expanduser(path)) as f:
+        for line in f:
+            line = line.strip()
+            if line and not line.startswith('#') and '=' in line:
+                key, value = line.split('=', 1)
+                conf[key.strip()] = value.strip()
+    return conf
+
+
+def add_connection_arguments(parser):
+    """
+    Adds --conf, --ip, --port, --username and --password to a command line parser.
+    :param parser: argparse.ArgumentParser
+    :return: None
+    """
+    parser.add_argument('--conf', help=f'PIRATE.conf to read rpcuser/rpcpassword/rpcport from (default {DEFAULT_CONF} if present)')
+    parser.add_argument('--ip', default='127.0.0.1')
+    parser.add_argument('--port')
+    parser.add_argument('--username')
+    parser.add_argument('--password')
+
+
+def resolve_connection(args):
+    """
+    Fills in what the connection arguments leave out from PIRATE.conf (--conf, or DEFAULT_CONF when it exists).
+    :param args: Parsed arguments of a parser set up with `add_connection_arguments`.
+    :return: (ip, port, username, password)
+    """
+    conf_path = args.conf or (DEFAULT_CONF if os.path.exists(os.path.expanduser(DEFAULT_CONF)) else None)
+    conf = read_conf(conf_path) if conf_path else {}
+    username = args.username or conf.get('rpcuser')
+    password = args.password or conf.get('rpcpassword')
+    if username is None or password is None:
+        raise ValueError('RPC credentials missing, pass --username/--password or --conf')
+    return args.ip, args.port or conf.get('rpcport', DEFAULT_PORT), username, password
+
+
+def _parse(number: int, line: str):
+    """
+    Used internally to turn an input line into (id, method, params) or (id, None, error message).
+    """
+    try:
+        call = loads(line)
+    except ValueError as e:
+        return number, None, f'invalid JSON: {e}'
+    if not isinstance(call, dict) or not isinstance(call.get('method'), str):
+        return number, None, 'expected an object with a "method" string'
+    params = call.get('params', [])
+    if not isinstance(params, list):
+        return call.get('id', number), None, '"params" has to be a list'
+    return call.get('id', number), call['method'], params
+
+
+def _error(e: Exception):
+    """
+    Used internally to report a failed request, with the node's JSON-RPC error when it sent one.
+    """
+    error = e.rpc_error() if isinstance(e, HttpStatusError) else None
+    return error if error is not None else {'message': str(e)}
+
+
+def _run_batch(wallet, batch):
+    """
+    Used internally to execute one batch of parsed calls.
+    :return: (encoded output lines, number of errors)
+    """
+    valid = [(ident, method, params) for ident, method, params in batch if method is not None]
+    responses = {}
+    if len(valid) == 1:
+        ident, method, params = valid[0]
+        try:
+            responses[0] = wallet.call(method, *params)
+        except (ConnectionError, OSError) as e:
+            responses[0] = {'result': None, 'error': _error(e)}
+    elif valid:
+        try:
+            for i, res in enumerate(wallet.call_batch([(method, params) for _ident, method, params in valid])):
+                responses[i] = res
+        except (ConnectionError, OSError) as e:
+            for i in range(len(valid)):
+                responses[i] = {'result': None, 'error': _error(e)}
+    lines = []
+    errors = 0
+    i = 0
+    for ident, method, params in batch:
+        if method is None:
+            res = {'result': None, 'error': {'message': params}}
+        else:
+            res = responses.get(i) or {'result': None, 'error': {'message': 'no response'}}
+            i += 1
+        errors += res.get('error') is not None
+        lines.append(dumps({'id': ident, 'result': res.get('result'), 'error': res.get('error')}))
+    return lines, errors
+
+
+class _Progress:
+    """
+    Throughput counters, printed to stderr at most every `interval` seconds.
+    """
+    def __init__(self, stream, interval: float = 1.0):
+        self.stream = stream
+        self.interval = interval
+        self.calls = 0
+        self.errors = 0
+        self.started = time.monotonic()
+        self._last = self.started
+        self._lock = threading.Lock()
+
+    def add(self, calls: int, errors: int):
+        with self._lock:
+            self.calls += calls
+            self.errors += errors
+        now = time.monotonic()
+        if now - self._last >= self.interval:
+            self._last = now
+            self.report('progress')
+
+    def report(self, label: str):
+        elapsed = time.monotonic() - self.started
+        rate = self.calls / elapsed if elapsed else 0.0
+        self.stream.write(f'{label}: {self.calls} calls, {self.errors} errors, {elapsed:.1f}s, {rate:.1f} calls/s\n')
+        self.stream.flush()
+
+
+def run(wallet, lines, out, concurrency: int = 4, batch_size: int = 1, progress=None):
+    """
+    Executes NDJSON calls and writes NDJSON results in input order.\n
+    At most 2 * concurrency batches are parsed or waiting to be written at any time, so memory stays constant
+    however long the input is.
+
+    :param wallet: PirateWallet
+    :param lines: Iterable of input lines.
+    :param out: Text stream the results are written to.
+    :param concurrency: Batches in flight at once.
+    :param batch_size: Calls per JSON-RPC batch request.
+    :param progress: Optional stream for throughput reports (stderr for the command line).
+    :return: (calls, errors)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if concurrency < 1: raise ValueError(f'"concurrency" has to be at least 1. Got {concurrency}')
+    if batch_size < 1: raise ValueError(f'"batch_size" has to be at least 1. Got {batch_size}')
+    stats = _Progress(progress) if progress is not None else None
+    numbered = ((number, line) for number, line in enumerate(lines, 1) if line.strip())
+    pending = deque()
+    calls = errors = 0
+
+    def _drain(limit):
+        nonlocal calls, errors
+        while len(pending) > limit:
+            done, failed = pending.popleft().result()
+            out.write('\n'.join(done) + '\n')
+            calls += len(done)
+            errors += failed
+            if stats is not None:
+                stats.add(len(done), failed)
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        while True:
+            chunk = list(islice(numbered, batch_size))
+            if not chunk:
+                break
+            pending.append(pool.submit(_run_batch, wallet, [_parse(number, line) for number, line in chunk]))
+            _drain(2 * concurrency)
+        _drain(0)
+    out.flush()
+    if stats is not None:
+        stats.report('done')
+    return calls, errors
+
+
+def main(argv=None):
+    """
+    Command line entry point, see the module docstring.
+    """
+    from argparse import ArgumentParser
+    from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+    parser = ArgumentParser(prog='pirate-rpc', description='Run NDJSON Pirate RPC calls and stream NDJSON results.')
+    parser.add_argument('input', nargs='?', default='-', help='NDJSON file with one call per line, "-" for stdin')
+    add_connection_arguments(parser)
+    parser.add_argument('-c', '--concurrency', type=int, default=4, help='requests in flight')
+    parser.add_argument('-b', '--batch-size', type=int, default=1, help='calls per JSON-RPC batch request')
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress on stderr')
+    args = parser.parse_args(argv)
+
+    try:
+        ip, port, username, password = resolve_connection(args)
+    except ValueError as e:
+        parser.error(str(e))
+    wallet = PirateWallet(ip=ip, port=port, username=username, password=password)
+
+    source = sys.stdin if args.input == '-' else open(args.input)
+    try:
+        _calls, errors = run(wallet, source, sys.stdout, concurrency=args.concurrency, batch_size=args.batch_size,
+                             progress=None if args.quiet else sys.stderr)
+    except BrokenPipeError:
+        return 1
+    except KeyboardInterrupt:
+        return 130
+    finally:
+        if source is not sys.stdin:
+            source.close()
+        wallet.transport.close()
+    return 1 if errors else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
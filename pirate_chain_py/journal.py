@@ -0,0 +1,266 @@
+"""
+Durable journal of z_sendmany submissions, for idempotent payouts and fast crash recovery.
+
+Every send goes through three records in an append-only NDJSON file:
+    intent     written and fsynced before z_sendmany is called
+    submitted  the opid returned by the node
+    success / failed   the txid or error once the operation finished
+`finish` collects finished operations with z_getoperationresult and writes their final records, call it wherever the
+payout loop polled z_getoperationresult before. After a crash only the entries without a final record are checked,
+with a single z_getoperationstatus call.
+
+Every send needs an idempotency key chosen by the caller (a payout id, an invoice number): two identical payouts
+are two sends as long as their keys differ. Sending a key again returns its entry, unless the entry `failed`, in which
+case nothing was sent and the send is attempted again. Entries in state `unknown` are never re-sent.
+"""
+
+import os
+import threading
+import time
+from hashlib import sha256
+from json import dumps, loads
+
+from pirate_chain_py.transport import HttpStatusError
+
+FINAL_STATES = ('success', 'failed')
+
+
+def payload_hash(from_address: str, amounts: list, args=None):
+    """
+    Stable hash of a z_sendmany payload.
+    :param from_address: Sending address.
+    :param amounts: z_sendmany amounts list.
+    :param args: Optional z_sendmany parameters.
+    :return: hex sha256
+    """
+    return sha256(dumps([from_address, amounts, args or []], sort_keys=True, separators=(',', ':')).encode('utf-8')).hexdigest()
+
+
+def _final_record(key: str, op: dict):
+    """
+    Used internally to turn a finished operation into its success/failed record.
+    :return: record dict, None while the operation is still queued or executing
+    """
+    if op.get('status') == 'success':
+        return {'k': key, 's': 'success', 'txid': (op.get('result') or {}).get('txid')}
+    if op.get('status') in ('failed', 'cancelled'):
+        return {'k': key, 's': 'failed', 'error': op.get('error')}
+    return None
+
+
+class SendJournal:
+    """
+    Journal of z_sendmany calls keyed by a caller supplied idempotency key.\n
+    Sending with a key that is already in the journal returns the recorded entry instead of sending again, except for
+    `failed` entries which are retried with the same key.
+    fsyncs are group committed: concurrent senders waiting on the disk share one fsync, and the final
+    success/failed records ride along with the next fsync (or `flush`) since recovery can re-derive them.
+    """
+    def __init__(self, wallet, path: str):
+        """
+        Opens (or creates) a journal and loads its entries.
+        :param wallet: PirateWallet used to send and to check operations.
+        :param path: Journal file.
+        """
+        self.wallet = wallet
+        self.path = path
+        self.entries = {}
+        self._lock = threading.RLock()
+        self._write_lock = threading.Lock()
+        self._sync_lock = threading.Lock()
+        self._written = 0
+        self._synced = 0
+        if os.path.exists(path):
+            good = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    if not line.endswith(b'\n'):
+                        break
+                    try:
+                        self._apply(loads(line))
+                    except ValueError:
+                        break
+                    good += len(line)
+            if good < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(good)
+        self._file = open(path, 'ab')
+
+    def _apply(self, record: dict):
+        """
+        Used internally to fold one record into the entries.
+        """
+        entry = self.entries.setdefault(record['k'], {'key': record['k']})
+        entry['state'] = record['s']
+        entry.update((field, value) for field, value in record.items() if field not in ('k', 's'))
+
+    def _append(self, record: dict, durable: bool):
+        """
+        Used internally to write one record, waiting for it to reach the disk when `durable`.
+        :return: sequence number of the record, for `_sync`
+        """
+        with self._lock:
+            self._apply(record)
+        with self._write_lock:
+            self._file.write(dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+            self._written += 1
+            seq = self._written
+        if durable:
+            self._sync(seq)
+        return seq
+
+    def _sync(self, seq: int):
+        """
+        Used internally to fsync at least up to record `seq`, one fsync covers every record written before it.
+        """
+        with self._sync_lock:
+            if self._synced >= seq:
+                return
+            with self._write_lock:
+                self._file.flush()
+                target = self._written
+            os.fsync(self._file.fileno())
+            self._synced = target
+
+    def flush(self):
+        """
+        Makes every written record durable.
+        :return: None
+        """
+        self._sync(self._written)
+
+    def send(self, key: str, from_address: str, amounts: list, args=None):
+        """
+        z_sendmany through the journal.
+        :param key: Idempotency key, e.g. a payout id. Identical payouts need different keys to both be sent.
+        :param from_address: Sending address.
+        :param amounts: z_sendmany amounts list.
+        :param args: Optional z_sendmany parameters (minconf, fee).
+        :return: Journal entry dict (key, hash, state, opid, txid, error, ...). An existing entry that did not fail is
+                 returned unchanged.
+        """
+        if not key: raise ValueError('"key" is required, e.g. the payout id.')
+        digest = payload_hash(from_address, amounts, args)
+        with self._lock:
+            existing = self.entries.get(key)
+            if existing is not None:
+                if existing.get('hash') != digest: raise ValueError(f'Idempotency key {key!r} was already used for a different payload.')
+                if existing['state'] != 'failed':
+                    return dict(existing)
+            seq = self._append({'k': key, 's': 'intent', 'hash': digest, 'from': from_address, 'amounts': amounts,
+                                'args': args or [], 'opid': None, 'error': None, 't': time.time()}, durable=False)
+        self._sync(seq)
+        try:
+            response = self.wallet.z_send_many(from_address, amounts, args)
+        except HttpStatusError as e:
+            error = e.rpc_error()
+            if error is None:
+                self._append({'k': key, 's': 'unknown', 'error': str(e)}, durable=True)
+                raise
+            self._append({'k': key, 's': 'failed', 'error': error}, durable=False)
+            return self.get(key)
+        except (ConnectionError, OSError) as e:
+            self._append({'k': key, 's': 'unknown', 'error': str(e)}, durable=True)
+            raise
+        if response is None or response.get('error') is not None:
+            self._append({'k': key, 's': 'failed', 'error': response and response.get('error')}, durable=False)
+        else:
+            self._append({'k': key, 's': 'submitted', 'opid': response['result']}, durable=True)
+        return self.get(key)
+
+    def get(self, key: str):
+        """
+        :param key: Idempotency key.
+        :return: Copy of the entry or None
+        """
+        with self._lock:
+            entry = self.entries.get(key)
+            return dict(entry) if entry is not None else None
+
+    def outstanding(self):
+        """
+        :return: Copies of the entries without a final success/failed record.
+        """
+        with self._lock:
+            return [dict(entry) for entry in self.entries.values() if entry['state'] not in FINAL_STATES]
+
+    def finish(self):
+        """
+        Collects the finished operations of submitted entries with one z_getoperationresult call and records their
+        txid or error. This is how a send is completed: z_getoperationresult removes the operation from the node, so
+        poll through the journal rather than calling it directly, or `recover` can no longer resolve the entry.
+
+        :return: {key: entry} for every entry that reached success/failed
+        """
+        submitted = {entry['opid']: entry['key'] for entry in self.outstanding()
+                     if entry['state'] == 'submitted' and entry.get('opid')}
+        if not submitted:
+            return {}
+        response = self.wallet.z_get_operation_result(list(submitted))
+        if response is None or response.get('error') is not None:
+            raise ConnectionError(f'z_getoperationresult failed: {response and response.get("error")}')
+        changed = {}
+        for op in response['result'] or []:
+            key = submitted.get(op.get('id'))
+            record = _final_record(key, op) if key is not None else None
+            if record is None:
+                continue
+            self._append(record, durable=False)
+            changed[key] = self.get(key)
+        self.flush()
+        return changed
+
+    def recover(self):
+        """
+        Resolves outstanding entries with one z_getoperationstatus call, run it on startup before sending.\n
+        Entries whose operation finished get their txid or error. Entries the node has no operation for (it restarted,
+        the process died before the opid came back, or its result was fetched outside `finish`) are marked 'unknown':
+        check those against the wallet history by hand, they are never re-sent automatically.
+
+        :return: {key: entry} for every entry whose state changed
+        """
+        pending = [entry for entry in self.outstanding() if entry['state'] in ('intent', 'submitted')]
+        opids = [entry['opid'] for entry in pending if entry.get('opid')]
+        statuses = {}
+        if opids:
+            response = self.wallet.z_get_operation_status(opids)
+            if response is None or response.get('error') is not None:
+                raise ConnectionError(f'z_getoperationstatus failed: {response and response.get("error")}')
+            statuses = {op.get('id'): op for op in response['result'] or []}
+        changed = {}
+        for entry in pending:
+            op = statuses.get(entry.get('opid'))
+            record = {'k': entry['key'], 's': 'unknown'} if op is None else _final_record(entry['key'], op)
+            if record is None:
+                continue
+            self._append(record, durable=False)
+            changed[entry['key']] = self.get(entry['key'])
+        self.flush()
+        return changed
+
+    def compact(self):
+        """
+        Rewrites the journal with one record per entry.
+        :return: None
+        """
+        with self._lock, self._write_lock:
+            tmp = f'{self.path}.compact'
+            with open(tmp, 'wb') as f:
+                for key, entry in self.entries.items():
+                    record = {'k': key, 's': entry['state']}
+                    record.update((field, value) for field, value in entry.items() if field not in ('key', 'state'))
+                    f.write(dumps(record, separators=(',', ':')).encode('utf-8') + b'\n')
+                f.flush()
+                os.fsync(f.fileno())
+            self._file.close()
+            os.replace(tmp, self.path)
+            self._file = open(self.path, 'ab')
+            self._written = self._synced = 0
+
+    def close(self):
+        """
+        Flushes and closes the journal.
+        :return: None
+        """
+        self.flush()
+        self._file.close()
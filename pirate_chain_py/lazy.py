@@ -0,0 +1,289 @@
+"""
+Lazy views over raw JSON-RPC response bytes, for large results where only a few fields are read.
+
+Containers are indexed on first use: one regular expression match per element finds where each element starts
+and ends, without building any Python objects for its content. Elements are decoded only when accessed, and
+containers smaller than DECODE_BELOW bytes (a single note or transaction) are returned as plain dicts and lists.
+Containers too big for one match (the `result` list itself, say) are walked element by element instead and their
+index is kept, so every byte of the response is scanned once.
+"""
+
+import re
+from array import array
+from bisect import bisect_left
+from json import loads
+
+MAX_FAST_DEPTH = 12
+MATCH_WINDOW = 1 << 18
+DECODE_BELOW = 1 << 12
+
+_WS = re.compile(rb'[ \t\n\r]*')
+_STR = rb'"[^"\\]*(?:\\.[^"\\]*)*"'
+_STR_FAST = rb'"[^"]*"'
+_PLAIN = rb'[^\[\]{}"]*'
+
+
+def _container_pattern(depth: int, string=_STR):
+    """
+    Used internally to build a pattern matching any container nested at most `depth` levels, in one match.
+    Brackets are not paired by type, the node's JSON is well formed so that is never needed.
+    """
+    inner = string
+    for _ in range(depth):
+        container = rb'[\[{]' + _PLAIN + rb'(?:(?:' + inner + rb')' + _PLAIN + rb')*[\]}]'
+        inner = string + rb'|' + container
+    return container
+
+
+_SCALAR = rb'|[^\s,\[\]{}:"]+'
+_SCALAR_VALUE = re.compile(_SCALAR[1:])
+_VALUE = re.compile(_STR + rb'|' + _container_pattern(MAX_FAST_DEPTH) + _SCALAR)
+# Strings as "[^"]*" run several times faster in the regex engine, and are exact as long as no \" is in reach.
+_VALUE_FAST = re.compile(_STR_FAST + rb'|' + _container_pattern(MAX_FAST_DEPTH, _STR_FAST) + _SCALAR)
+
+
+def _escapes(buf: bytes):
+    """
+    Used internally to find every \" in the document once.
+    :return: sorted array of offsets
+    """
+    found = array('q')
+    pos = buf.find(b'\\"')
+    while pos >= 0:
+        found.append(pos)
+        pos = buf.find(b'\\"', pos + 2)
+    return found
+
+
+def _skip_value(buf: bytes, pos: int, escapes):
+    """
+    Used internally to find the end of the JSON value starting at `pos`.
+    Strings and numbers are scanned to their end whatever their length. Containers take a single match: the fast
+    pattern is stopped at the next \", containers reaching past it are matched with the exact pattern.
+    :return: end offset (exclusive), or None for a container that has to be walked (too big or too deep)
+    """
+    first = buf[pos]
+    if first == 0x22:
+        return _string_end(buf, pos)
+    if first not in b'[{':
+        match = _SCALAR_VALUE.match(buf, pos)
+        if match is None:
+            raise ValueError(f'Invalid JSON value at offset {pos}')
+        return match.end()
+    endpos = pos + MATCH_WINDOW
+    i = bisect_left(escapes, pos)
+    match = _VALUE_FAST.match(buf, pos, escapes[i] if i < len(escapes) and escapes[i] < endpos else endpos)
+    if match is None:
+        match = _VALUE.match(buf, pos, endpos)
+    return match.end() if match is not None else None
+
+
+def _string_end(buf: bytes, pos: int):
+    """
+    Used internally to find the end of a string of any length, skipping escaped quotes.
+    :return: end offset (exclusive)
+    """
+    end = buf.find(b'"', pos + 1)
+    while end >= 0:
+        backslashes = end - 1
+        while buf[backslashes] == 0x5C:
+            backslashes -= 1
+        if (end - 1 - backslashes) % 2 == 0:
+            return end + 1
+        end = buf.find(b'"', end + 1)
+    raise ValueError(f'Unterminated string at offset {pos}')
+
+
+def _node(buf: bytes, start: int, end, escapes):
+    """
+    Used internally to create the lazy container for a span.
+    """
+    return (LazyArray if buf[start] == 0x5B else LazyObject)(buf, start, end, escapes)
+
+
+def _wrap(buf: bytes, start: int, end: int, escapes=None):
+    """
+    Used internally to turn a value span into a lazy container, or into plain Python objects when it is small.
+    """
+    if buf[start] in b'[{' and end - start >= DECODE_BELOW:
+        return _node(buf, start, end, escapes)
+    return loads(buf[start:end])
+
+
+class _LazyNode:
+    """
+    Common part of LazyArray and LazyObject.
+    """
+    __slots__ = ('_buf', '_start', '_end', '_escapes', '_index', '_children')
+
+    def __init__(self, buf: bytes, start: int = 0, end: int = None, escapes=None):
+        """
+        :param buf: Raw JSON bytes.
+        :param start: Offset of the opening bracket.
+        :param end: Offset after the closing bracket, found by indexing when None.
+        :param escapes: Offsets of every \" in `buf`, shared by all nodes of a document. Found when None.
+        """
+        self._buf = buf
+        self._start = start
+        self._end = end
+        self._escapes = escapes if escapes is not None else _escapes(buf)
+        self._index = None
+        self._children = None
+
+    @property
+    def raw(self):
+        """
+        :return: The JSON bytes of this value.
+        """
+        if self._end is None:
+            self._build()
+        return self._buf[self._start:self._end]
+
+    def decode(self):
+        """
+        :return: This value fully decoded into plain Python objects.
+        """
+        return loads(self.raw)
+
+    def _value(self, slot, start: int, end: int):
+        """
+        Used internally to return an element, reusing containers that were walked while indexing.
+        """
+        if self._children is not None and slot in self._children:
+            return self._children[slot]
+        return _wrap(self._buf, start, end, self._escapes)
+
+    def _elements(self, close: int):
+        """
+        Used internally to walk the elements of this container, sets the container end when done.
+        :return: iterator of (key span or None, value start, value end)
+        """
+        buf = self._buf
+        escapes = self._escapes
+        is_object = close == 0x7D
+        pos = _WS.match(buf, self._start + 1).end()
+        slot = 0
+        if buf[pos] != close:
+            while True:
+                key = None
+                if is_object:
+                    key_end = _skip_value(buf, pos, escapes)
+                    key = loads(buf[pos:key_end])
+                    pos = _WS.match(buf, key_end).end()
+                    if buf[pos] != 0x3A:
+                        raise ValueError(f'Expected ":" at offset {pos}')
+                    pos = _WS.match(buf, pos + 1).end()
+                end = _skip_value(buf, pos, escapes)
+                if end is None:
+                    child = _node(buf, pos, None, escapes)
+                    child._build()
+                    end = child._end
+                    if self._children is None:
+                        self._children = {}
+                    self._children[key if is_object else slot] = child
+                yield key, pos, end
+                slot += 1
+                pos = _WS.match(buf, end).end()
+                if buf[pos] == close:
+                    break
+                if buf[pos] != 0x2C:
+                    raise ValueError(f'Expected "," at offset {pos}')
+                pos = _WS.match(buf, pos + 1).end()
+        self._end = pos + 1
+
+
+class LazyArray(_LazyNode):
+    """
+    JSON array whose elements are located once and decoded on access. Supports len(), indexing, slicing and iteration.
+    """
+    __slots__ = ()
+
+    def _build(self):
+        """
+        Used internally to locate every element.
+        """
+        starts = array('q')
+        ends = array('q')
+        for _key, start, end in self._elements(0x5D):
+            starts.append(start)
+            ends.append(end)
+        self._index = (starts, ends)
+        return self._index
+
+    def __len__(self):
+        return len((self._index or self._build())[0])
+
+    def __getitem__(self, item):
+        starts, ends = self._index or self._build()
+        if isinstance(item, slice):
+            return [self._value(i, starts[i], ends[i]) for i in range(*item.indices(len(starts)))]
+        if item < 0:
+            item += len(starts)
+        return self._value(item, starts[item], ends[item])
+
+    def __iter__(self):
+        starts, ends = self._index or self._build()
+        for i in range(len(starts)):
+            yield self._value(i, starts[i], ends[i])
+
+    def __repr__(self):
+        return f'LazyArray({len(self)} items, {self._end - self._start} bytes)'
+
+
+class LazyObject(_LazyNode):
+    """
+    JSON object whose values are located once and decoded on access. Behaves like a read-only dict.
+    """
+    __slots__ = ()
+
+    def _build(self):
+        """
+        Used internally to locate every member.
+        """
+        self._index = {key: (start, end) for key, start, end in self._elements(0x7D)}
+        return self._index
+
+    def _members(self):
+        """
+        Used internally to get the member index, building it on first use.
+        """
+        return self._index if self._index is not None else self._build()
+
+    def __len__(self):
+        return len(self._members())
+
+    def __getitem__(self, key):
+        start, end = self._members()[key]
+        return self._value(key, start, end)
+
+    def get(self, key, default=None):
+        """
+        :return: The decoded (or lazy) value of `key`, or `default`.
+        """
+        return self[key] if key in self else default
+
+    def __contains__(self, key):
+        return key in self._members()
+
+    def __iter__(self):
+        return iter(self._members())
+
+    def keys(self):
+        return self._members().keys()
+
+    def items(self):
+        return ((key, self[key]) for key in self)
+
+    def __repr__(self):
+        return f'LazyObject({list(self.keys())!r}, {self._end - self._start} bytes)'
+
+
+def lazy_loads(raw: bytes):
+    """
+    Wraps raw JSON bytes without decoding them.
+    :param raw: JSON document.
+    :return: LazyObject, LazyArray or the decoded scalar
+    """
+    start = _WS.match(raw).end()
+    end = len(raw.rstrip())
+    return _wrap(raw, start, end)
@@ -0,0 +1,310 @@
+"""
+In-process balance ledger, so per-address balance reads don't make the node sum notes on every request.
+"""
+
+import threading
+from collections import defaultdict, deque
+
+from pirate_chain_py.units import ZATS, output_index, to_zat
+
+
+class BalanceLedger:
+    """
+    Per-address balances kept in memory and updated from observed transactions.\n
+    The ledger is seeded from z_listunspent and then follows receives and spends from zs_gettransaction /
+    z_viewtransaction results and new blocks, e.g. from a NotifyListener (see `attach`). Balances are kept in one bucket
+    per configured confirmation depth, so reading a balance is a dictionary lookup.
+    walletnotify and blocknotify are not ordered, so a mined transaction can be observed before its block advanced the
+    ledger. Notes are placed by the transaction's blockhash: until the block of that hash is passed to `advance` they
+    only count as unconfirmed, never one block early.
+    Reorgs and missed events are corrected by `reconcile`, which can run periodically (see `start`).
+    """
+    def __init__(self, wallet, depths=(0, 1), include_watch_only: bool = False):
+        """
+        :param wallet: PirateWallet used to seed and reconcile the ledger.
+        :param depths: Confirmation depths balances can be read at, e.g. (0, 1, 10).
+        :param include_watch_only: Also track notes of watch only addresses.
+        """
+        if not depths: raise ValueError('"depths" needs at least one confirmation depth.')
+        self.wallet = wallet
+        self.depths = tuple(sorted(set(int(d) for d in depths)))
+        if self.depths[0] < 0: raise ValueError(f'"depths" can not be negative. Got {self.depths[0]}')
+        self.include_watch_only = include_watch_only
+        self._lock = threading.RLock()
+        self._timer = None
+        self._reset()
+
+    def _reset(self):
+        """
+        Used internally to clear all state.
+        """
+        self._tip = 0
+        self._notes = {}
+        self._by_height = defaultdict(set)
+        self._spent = set()
+        self._heights = {}
+        self._recent = deque()
+        self._pending = defaultdict(set)
+        self._buckets = {d: defaultdict(int) for d in self.depths}
+        self._totals = dict.fromkeys(self.depths, 0)
+
+    def _confirmations(self, height):
+        """
+        Used internally to get the confirmations of a note from its (ledger relative) height.
+        """
+        return 0 if height is None else self._tip - height + 1
+
+    def _credit(self, address: str, zats: int, depths):
+        """
+        Used internally to add a note value to buckets.
+        """
+        for d in depths:
+            self._buckets[d][address] += zats
+            self._totals[d] += zats
+
+    def _add(self, key, address: str, zats: int, confirmations: int):
+        """
+        Used internally to add a new note.
+        """
+        height = self._tip - confirmations + 1 if confirmations > 0 else None
+        self._notes[key] = [address, zats, height]
+        if height is not None:
+            self._by_height[height].add(key)
+        self._credit(address, zats, [d for d in self.depths if d <= max(confirmations, 0)])
+
+    def _confirm(self, key, confirmations: int):
+        """
+        Used internally to move a pending note into the buckets it now qualifies for.
+        """
+        note = self._notes[key]
+        if note[2] is not None or confirmations <= 0:
+            return
+        note[2] = self._tip - confirmations + 1
+        self._by_height[note[2]].add(key)
+        self._credit(note[0], note[1], [d for d in self.depths if 0 < d <= confirmations])
+
+    def _placed(self, tx: dict, confirmations: int):
+        """
+        Used internally to turn the confirmations of a transaction into ledger relative ones.
+        :return: (confirmations, blockhash the notes wait for or None)
+        """
+        block = tx.get('blockhash')
+        if confirmations <= 0 or block is None or confirmations > self.depths[-1]:
+            return confirmations, None
+        height = self._heights.get(block)
+        if height is None:
+            return 0, block
+        return self._tip - height + 1, None
+
+    def _remove(self, key):
+        """
+        Used internally to drop a spent note from every bucket it is in.
+        """
+        address, zats, height = self._notes.pop(key)
+        confirmations = self._confirmations(height)
+        if height is not None:
+            self._by_height[height].discard(key)
+            if not self._by_height[height]:
+                del self._by_height[height]
+        self._credit(address, -zats, [d for d in self.depths if d <= confirmations])
+        for d in self.depths:
+            if self._buckets[d].get(address) == 0:
+                del self._buckets[d][address]
+
+    def _fetch_notes(self):
+        """
+        Used internally to list every unspent note, including unconfirmed ones.
+        :return: list of note dicts from z_listunspent
+        """
+        response = self.wallet.z_list_unspent([0, 9999999, self.include_watch_only])
+        if response is None or response.get('error') is not None:
+            raise ConnectionError(f'z_listunspent failed: {response and response.get("error")}')
+        return response['result'] or []
+
+    def seed(self):
+        """
+        Replaces the ledger content with the node's current unspent notes.
+        :return: self
+        """
+        notes = self._fetch_notes()
+        with self._lock:
+            self._reset()
+            for note in notes:
+                self._add((note['txid'], output_index(note)), note['address'], to_zat(note), int(note.get('confirmations', 0)))
+        return self
+
+    def reconcile(self):
+        """
+        Re-seeds the ledger from the node and reports where it had drifted.
+        :return: {address: {depth: (ledger_zats, node_zats)}} for every address that differed.
+        """
+        with self._lock:
+            before = {d: dict(bucket) for d, bucket in self._buckets.items()}
+        self.seed()
+        drift = {}
+        with self._lock:
+            for d in self.depths:
+                after = self._buckets[d]
+                for address in set(before[d]).union(after):
+                    old, new = before[d].get(address, 0), after.get(address, 0)
+                    if old != new:
+                        drift.setdefault(address, {})[d] = (old, new)
+        return drift
+
+    def observe_transaction(self, tx: dict):
+        """
+        Applies the receives and spends of one wallet transaction.
+        :param tx: Result of zs_gettransaction or z_viewtransaction.
+        :return: None
+        """
+        confirmations = max(int(tx.get('confirmations', 0) or 0), 0)
+        received = tx.get('received')
+        if received is None:
+            received = [out for out in tx.get('outputs', ()) if not out.get('recovered', False) and not out.get('outgoing', False)]
+        with self._lock:
+            confirmations, block = self._placed(tx, confirmations)
+            for spend in tx.get('spends', ()):
+                key = (spend.get('txidPrev'), spend.get('outputPrev', spend.get('jsOutputPrev')))
+                self._spent.add(key)
+                if key in self._notes:
+                    self._remove(key)
+            for out in received:
+                key = (tx['txid'], output_index(out))
+                if key in self._spent:
+                    continue
+                if key in self._notes:
+                    self._confirm(key, confirmations)
+                else:
+                    self._add(key, out['address'], to_zat(out), confirmations)
+                if block is not None:
+                    self._pending[block].add(key)
+
+    def advance(self, blocks: int = 1, block_hash: str = None):
+        """
+        Moves the ledger tip forward, notes crossing a confirmation depth move into that depth's bucket.
+        :param blocks: Number of new blocks.
+        :param block_hash: Hash of the new tip, as sent by blocknotify. Notes of transactions observed in this block
+                           before it arrived are confirmed now.
+        :return: None
+        """
+        with self._lock:
+            if blocks > self.depths[-1]:
+                self._tip += blocks
+                self._rebuild_buckets()
+            else:
+                for _ in range(blocks):
+                    self._tip += 1
+                    for d in self.depths:
+                        if d < 1:
+                            continue
+                        for key in self._by_height.get(self._tip - d + 1, ()):
+                            address, zats, _height = self._notes[key]
+                            self._credit(address, zats, (d,))
+            if block_hash is None:
+                return
+            self._heights[block_hash] = self._tip
+            self._recent.append(block_hash)
+            while len(self._recent) > self.depths[-1]:
+                self._heights.pop(self._recent.popleft(), None)
+            for key in self._pending.pop(block_hash, ()):
+                if key in self._notes:
+                    self._confirm(key, 1)
+
+    def _rebuild_buckets(self):
+        """
+        Used internally to recompute every bucket from the notes.
+        """
+        self._buckets = {d: defaultdict(int) for d in self.depths}
+        self._totals = dict.fromkeys(self.depths, 0)
+        for address, zats, height in self._notes.values():
+            confirmations = self._confirmations(height)
+            self._credit(address, zats, [d for d in self.depths if d <= confirmations])
+
+    def _depth(self, minconf: int):
+        """
+        Used internally to validate a requested confirmation depth.
+        """
+        if minconf not in self._totals: raise ValueError(f'"minconf" has to be one of the ledger depths {self.depths}. Got {minconf}')
+        return minconf
+
+    def balance_zat(self, address: str, minconf: int = 1):
+        """
+        :param address: Shielded address.
+        :param minconf: One of the configured depths.
+        :return: Balance in arrrtoshis.
+        """
+        return self._buckets[self._depth(minconf)].get(address, 0)
+
+    def balance(self, address: str, minconf: int = 1):
+        """
+        Same as z_getbalance(address, [minconf]) without a round-trip.
+        :param address: Shielded address.
+        :param minconf: One of the configured depths.
+        :return: Balance in ARRR.
+        """
+        return self.balance_zat(address, minconf) / ZATS
+
+    def balances(self, minconf: int = 1):
+        """
+        :param minconf: One of the configured depths.
+        :return: {address: balance in ARRR} for every address holding notes.
+        """
+        with self._lock:
+            return {address: zats / ZATS for address, zats in self._buckets[self._depth(minconf)].items() if zats}
+
+    def total(self, minconf: int = 1):
+        """
+        :param minconf: One of the configured depths.
+        :return: Total shielded balance in ARRR.
+        """
+        return self._totals[self._depth(minconf)] / ZATS
+
+    def attach(self, listener):
+        """
+        Follows a NotifyListener: wallet events are applied, block events advance the tip.
+        :param listener: pirate_chain_py.notify.NotifyListener
+        :return: The subscribed callback, pass it to listener.unsubscribe to detach.
+        """
+        def _on_event(kind, ident, data):
+            if kind == 'block':
+                self.advance(1, ident)
+            elif data:
+                self.observe_transaction(data)
+        return listener.subscribe(_on_event)
+
+    def start(self, interval: float = 600.0):
+        """
+        Reconciles against the node every `interval` seconds in a background thread.
+        :param interval: Seconds between reconciliations.
+        :return: self
+        """
+        def _run():
+            try:
+                self.reconcile()
+            except (ConnectionError, OSError):
+                pass
+            with self._lock:
+                if self._timer is not None:
+                    self._schedule(interval, _run)
+
+        with self._lock:
+            self._schedule(interval, _run)
+        return self
+
+    def _schedule(self, interval: float, target):
+        """
+        Used internally to arm the reconciliation timer.
+        """
+        self._timer = threading.Timer(interval, target)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def stop(self):
+        """
+        Stops periodic reconciliation.
+        :return: None
+        """
+        with self._lock:
+            timer, self._timer = self._timer, None
+        if timer is not None:
+            timer.cancel()
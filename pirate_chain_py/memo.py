@@ -0,0 +1,181 @@
+"""
+Memo decoding and an indexed memo lookup for matching deposits to customer references.
+
+Memo fields are 512 bytes, returned as hex by the node (`memo`) and, when they hold valid UTF-8, also as text
+(`memoStr`). Text memos start with a byte <= 0xF4 and are padded with zero bytes, 0xF6 means "no memo" and anything
+else is arbitrary data (see ZIP 302).
+"""
+
+import threading
+
+from pirate_chain_py.units import output_index, to_zat
+
+HEAD_BYTES = 64
+_ZERO_HEX = '0' * 1024
+
+
+def _text(raw: bytes):
+    """
+    Used internally to turn raw memo bytes into text, None for empty or non text memos.
+    """
+    raw = raw.rstrip(b'\x00')
+    if not raw or raw[0] > 0xF4:
+        return None
+    try:
+        return raw.decode('utf-8')
+    except UnicodeDecodeError:
+        return None
+
+
+def decode_memo(memo_hex: str):
+    """
+    Decodes one hex memo field.
+    :param memo_hex: `memo` field as returned by the node.
+    :return: memo text or None when the memo is empty or not text
+    """
+    return decode_memos([memo_hex])[0]
+
+
+def decode_memos(memo_hexes):
+    """
+    Decodes many hex memo fields in one pass.\n
+    Most memos are a short reference followed by zero padding, so a field whose hex ends in zeros past the first
+    HEAD_BYTES bytes only has that head hex decoded. The padding check is a plain string comparison, which is far
+    cheaper than hex decoding the full 512 bytes of every memo.
+
+    :param memo_hexes: Sequence of `memo` fields (str or None).
+    :return: list of memo text or None, in the same order
+    """
+    head = HEAD_BYTES * 2
+    zeros = _ZERO_HEX
+    fromhex = bytes.fromhex
+    out = []
+    append = out.append
+    for memo_hex in memo_hexes:
+        if not memo_hex:
+            append(None)
+            continue
+        try:
+            if len(memo_hex) > head and memo_hex.endswith(zeros[:len(memo_hex) - head]):
+                raw = fromhex(memo_hex[:head])
+            else:
+                raw = fromhex(memo_hex)
+        except ValueError:
+            append(None)
+            continue
+        append(_text(raw))
+    return out
+
+
+def memo_of(entry: dict):
+    """
+    Memo text of one output entry, the node's `memoStr` is used when present.
+    :param entry: Output entry with `memo` and optionally `memoStr`.
+    :return: memo text or None
+    """
+    if entry.get('memoStr') is not None:
+        return entry['memoStr']
+    return decode_memo(entry.get('memo'))
+
+
+def _outputs(records):
+    """
+    Used internally to flatten RPC results into (txid, output entry) pairs.\n
+    Accepts transactions with `received` (zs_gettransaction, zs_listtransactions, zs_listreceivedbyaddress),
+    transactions with `outputs` (z_viewtransaction) and flat note entries (z_listunspent, z_listreceivedbyaddress).
+    """
+    for record in records:
+        if 'received' in record:
+            for out in record['received']:
+                yield record['txid'], out
+        elif 'outputs' in record:
+            for out in record['outputs']:
+                if not out.get('recovered', False) and not out.get('outgoing', False):
+                    yield record['txid'], out
+        else:
+            yield record['txid'], record
+
+
+class MemoIndex:
+    """
+    Index from memo text to the outputs that carried it, kept in SQLite (in memory, or on disk when a path is given).\n
+    Matching a customer reference is then an indexed lookup instead of decoding and scanning every transaction.
+    """
+    def __init__(self, path: str = ':memory:', normalize=None):
+        """
+        :param path: SQLite database file, ':memory:' keeps the index in memory only.
+        :param normalize: Function applied to memos and references before indexing and lookup. Defaults to str.strip.
+        """
+        import sqlite3
+        self.path = path
+        self.normalize = normalize if normalize is not None else str.strip
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(path, check_same_thread=False)
+        self._db.execute('CREATE TABLE IF NOT EXISTS memos (memo TEXT NOT NULL, txid TEXT NOT NULL, output INTEGER NOT NULL, '
+                         'address TEXT, zat INTEGER, PRIMARY KEY (txid, output))')
+        self._db.execute('CREATE INDEX IF NOT EXISTS memos_by_memo ON memos (memo)')
+        self._db.commit()
+
+    def add(self, records):
+        """
+        Indexes every text memo found in RPC results. Re-adding an output replaces it, entries without an output
+        index can not be told apart and are skipped.
+        :param records: List of transactions or note entries, see module docstring.
+        :return: Number of outputs with a text memo that were indexed.
+        """
+        pairs = list(_outputs(records))
+        pending = [i for i, (_txid, out) in enumerate(pairs) if out.get('memoStr') is None]
+        decoded = dict(zip(pending, decode_memos([pairs[i][1].get('memo') for i in pending])))
+        rows = []
+        for i, (txid, out) in enumerate(pairs):
+            text = decoded[i] if i in decoded else out['memoStr']
+            index = output_index(out)
+            if text is None or index is None:
+                continue
+            text = self.normalize(text)
+            if not text:
+                continue
+            rows.append((text, txid, index, out.get('address'), to_zat(out)))
+        with self._lock:
+            self._db.executemany('INSERT OR REPLACE INTO memos VALUES (?, ?, ?, ?, ?)', rows)
+            self._db.commit()
+        return len(rows)
+
+    def add_from_wallet(self, wallet, args=None):
+        """
+        Indexes the wallet's transactions from zs_listtransactions.
+        :param wallet: PirateWallet
+        :param args: Optional zs_listtransactions parameters (min confirmations, filter type, filter, count).
+        :return: Number of outputs indexed.
+        """
+        response = wallet.zs_list_transactions([] if args is None else args)
+        if response is None or response.get('error') is not None:
+            raise ConnectionError(f'zs_listtransactions failed: {response and response.get("error")}')
+        return self.add(response['result'] or [])
+
+    def lookup(self, reference: str):
+        """
+        Finds the outputs whose memo equals a reference.
+        :param reference: Customer reference, normalized like the memos.
+        :return: list of {'memo', 'txid', 'output', 'address', 'zat'} dicts
+        """
+        with self._lock:
+            rows = self._db.execute('SELECT memo, txid, output, address, zat FROM memos WHERE memo = ?',
+                                    (self.normalize(reference),)).fetchall()
+        return [dict(zip(('memo', 'txid', 'output', 'address', 'zat'), row)) for row in rows]
+
+    def __contains__(self, reference: str):
+        with self._lock:
+            return self._db.execute('SELECT 1 FROM memos WHERE memo = ? LIMIT 1', (self.normalize(reference),)).fetchone() is not None
+
+    def __len__(self):
+        with self._lock:
+            return self._db.execute('SELECT COUNT(*) FROM memos').fetchone()[0]
+
+    def close(self):
+        """
+        Closes the database.
+        :return: None
+        """
+        with self._lock:
+            self._db.close()
@@ -0,0 +1,235 @@
+"""
+Push driven wallet updates from the node's -walletnotify and -blocknotify hooks.
+
+The node runs a command for every wallet transaction and every new block. Point those hooks at a NotifyListener
+and only the affected transaction is fetched and handed to subscribers, instead of polling the transaction list.
+
+PIRATE.conf:
+    walletnotify=python3 -m pirate_chain_py.notify --socket /tmp/pirate-notify.sock wallet %s
+    blocknotify=python3 -m pirate_chain_py.notify --socket /tmp/pirate-notify.sock block %s
+
+Any tool that writes a line "wallet <txid>" or "block <blockhash>" to the socket works as well,
+e.g. `echo "wallet %s" | socat - UNIX-CONNECT:/tmp/pirate-notify.sock`.
+"""
+
+import logging
+import threading
+from string import hexdigits
+
+logger = logging.getLogger(__name__)
+
+KINDS = ('wallet', 'block')
+_HEX = frozenset(hexdigits)
+
+
+def _bind_unix(socket_path: str, handler):
+    """
+    Used internally to listen on a Unix socket only its owner can connect to. A stale socket left at the path is
+    replaced, any other file there is an error.
+    """
+    import os
+    import socketserver
+    import stat
+    try:
+        mode = os.lstat(socket_path).st_mode
+    except FileNotFoundError:
+        pass
+    else:
+        if not stat.S_ISSOCK(mode): raise FileExistsError(f'"socket_path" {socket_path} exists and is not a socket.')
+        os.unlink(socket_path)
+    umask = os.umask(0o177)
+    try:
+        return socketserver.ThreadingUnixStreamServer(socket_path, handler)
+    finally:
+        os.umask(umask)
+
+
+class NotifyListener:
+    """
+    Receives notify lines on a Unix socket or a loopback TCP port, fetches the notified transaction and dispatches
+    it to subscribers.\n
+    Subscribers are called as `callback(kind, ident, data)`:
+        kind 'wallet': ident is the txid, data the result of the fetch method (zs_gettransaction by default)
+        kind 'block': ident is the block hash, data is None
+    """
+    def __init__(self, wallet, socket_path: str = None, ip: str = '127.0.0.1', port: int = 0,
+                 fetch: str = 'zs_gettransaction', workers: int = 4):
+        """
+        :param wallet: PirateWallet used to fetch notified transactions.
+        :param socket_path: Listen on this Unix socket, created with mode 0600 so only the node's user (run the
+                            listener as that user) can send events. When None a TCP port on `ip` is used.
+        :param ip: Address to listen on when no socket path is given, keep it on loopback.
+        :param port: TCP port, 0 picks a free one (see `.port`).
+        :param fetch: RPC method used to fetch a notified txid, 'zs_gettransaction' or 'z_viewtransaction'.
+        :param workers: Threads fetching transactions and running subscribers.
+        """
+        import socketserver
+        from concurrent.futures import ThreadPoolExecutor
+        if fetch not in ('zs_gettransaction', 'z_viewtransaction'): raise ValueError(f'"fetch" has to be either "zs_gettransaction" or "z_viewtransaction". Got {fetch}')
+        self.wallet = wallet
+        self.fetch = fetch
+        self.socket_path = socket_path
+        self._subscribers = []
+        self._lock = threading.Lock()
+        self._pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='pirate-notify')
+        self._thread = None
+
+        listener = self
+
+        class _Handler(socketserver.StreamRequestHandler):
+            def handle(self):
+                for line in self.rfile:
+                    listener.notify_line(line)
+
+        if socket_path is not None:
+            self._server = _bind_unix(socket_path, _Handler)
+            self.ip, self.port = None, None
+        else:
+            self._server = socketserver.ThreadingTCPServer((ip, port), _Handler)
+            self.ip, self.port = self._server.server_address[:2]
+        self._server.daemon_threads = True
+
+    def subscribe(self, callback, kinds=KINDS):
+        """
+        Registers a subscriber.
+        :param callback: Called as callback(kind, ident, data) from a worker thread.
+        :param kinds: Event kinds to receive, any of ('wallet', 'block').
+        :return: callback, so this can be used as a decorator.
+        """
+        if isinstance(kinds, str): kinds = (kinds,)
+        for kind in kinds:
+            if kind not in KINDS: raise ValueError(f'"kinds" can only contain {KINDS}. Got {kind}')
+        with self._lock:
+            self._subscribers.append((callback, frozenset(kinds)))
+        return callback
+
+    def unsubscribe(self, callback):
+        """
+        Removes every registration of a subscriber.
+        :param callback: Previously subscribed callback.
+        :return: None
+        """
+        with self._lock:
+            self._subscribers = [(cb, kinds) for cb, kinds in self._subscribers if cb is not callback]
+
+    def notify_line(self, line: bytes):
+        """
+        Handles one "<kind> <id>" line as written by the notify command. Malformed lines are ignored.
+        :param line: Raw line.
+        :return: True when the line was accepted.
+        """
+        parts = line.decode('ascii', 'replace').split()
+        if len(parts) != 2:
+            return False
+        return self.notify(parts[0], parts[1])
+
+    def notify(self, kind: str, ident: str):
+        """
+        Queues one event for fetching and dispatch.
+        :param kind: 'wallet' or 'block'
+        :param ident: txid or block hash
+        :return: True when the event was accepted.
+        """
+        if kind not in KINDS or len(ident) != 64 or not _HEX.issuperset(ident):
+            logger.warning('Ignoring malformed notification %r %r', kind, ident)
+            return False
+        self._pool.submit(self._dispatch, kind, ident)
+        return True
+
+    def _dispatch(self, kind: str, ident: str):
+        """
+        Used internally to fetch the notified transaction and call subscribers.
+        """
+        with self._lock:
+            subscribers = [cb for cb, kinds in self._subscribers if kind in kinds]
+        if not subscribers:
+            return
+        data = None
+        if kind == 'wallet':
+            try:
+                response = self.wallet.call(self.fetch, ident)
+            except (ConnectionError, OSError):
+                logger.exception('Fetching notified transaction %s failed', ident)
+                return
+            if response is None or response.get('error') is not None:
+                logger.error('Fetching notified transaction %s failed: %s', ident, response and response.get('error'))
+                return
+            data = response.get('result')
+        for callback in subscribers:
+            try:
+                callback(kind, ident, data)
+            except Exception:
+                logger.exception('Notify subscriber %r failed', callback)
+
+    def start(self):
+        """
+        Listens in a background thread.
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='pirate-notify-listener', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Listens in the calling thread.
+        :return: None
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stops listening, waits for queued events and removes the Unix socket.
+        :return: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+        self._pool.shutdown(wait=True)
+        if self.socket_path is not None:
+            import os
+            try:
+                os.unlink(self.socket_path)
+            except FileNotFoundError:
+                pass
+
+
+def send(kind: str, ident: str, socket_path: str = None, ip: str = '127.0.0.1', port: int = None, timeout: float = 5.0):
+    """
+    Sends one notification to a NotifyListener, this is what the notify hook command runs.
+    :param kind: 'wallet' or 'block'
+    :param ident: txid or block hash
+    :param socket_path: Unix socket of the listener.
+    :param ip: Listener address when no socket path is given.
+    :param port: Listener TCP port when no socket path is given.
+    :param timeout: Seconds to wait for the connection.
+    :return: None
+    """
+    import socket
+    if socket_path is not None:
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.settimeout(timeout)
+        sock.connect(socket_path)
+    else:
+        if port is None: raise ValueError('Either "socket_path" or "port" is required.')
+        sock = socket.create_connection((ip, port), timeout=timeout)
+    with sock:
+        sock.sendall(f'{kind} {ident}\n'.encode('ascii'))
+
+
+def main(argv=None):
+    """
+    Command line entry point for the notify hooks, see the module docstring.
+    """
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog='python -m pirate_chain_py.notify', description='Forward a walletnotify/blocknotify event to a NotifyListener.')
+    parser.add_argument('--socket', dest='socket_path')
+    parser.add_argument('--ip', default='127.0.0.1')
+    parser.add_argument('--port', type=int)
+    parser.add_argument('kind', choices=KINDS)
+    parser.add_argument('ident')
+    args = parser.parse_args(argv)
+    send(args.kind, args.ident, socket_path=args.socket_path, ip=args.ip, port=args.port)
+
+
+if __name__ == '__main__':
+    main()
@@ -2,35 +2,150 @@
 Pirate Chain RPC methods wrapped in Python
 """
 
-from uuid import uuid4
-from requests import post, status_codes
-from requests.auth import HTTPBasicAuth
+from itertools import count
+
+from pirate_chain_py.transport import HttpTransport
 
 
 class PirateWallet:
     """
     Class with all fully documented Pirate Chain RPC methods.
     """
-    def __init__(self, ip: str, port: str, username: str, password: str):
+    def __init__(self, ip: str, port: str, username: str, password: str, transport=None, scheduler=None, cache=None):
+        """
+        :param ip: RPC host of the node
+        :param port: RPC port of the node
+        :param username: rpcuser from PIRATE.conf
+        :param password: rpcpassword from PIRATE.conf
+        :param transport: Optional object with a `post(body: bytes) -> bytes` method. Defaults to the stdlib based HttpTransport.
+        :param scheduler: Optional RpcScheduler admitting calls by priority class, share one per node.
+        :param cache: Optional SharedCache serving immutable results (e.g. confirmed transactions) across processes.
+                      Entries are scoped to this node URL and rpcuser.
+        """
+        from json import dumps, loads
         self.url = f'http://{ip}:{port}'
-        self.auth = HTTPBasicAuth(username=username, password=password)
+        self.auth = (username, password)
+        self.transport = transport if transport is not None else HttpTransport(ip=ip, port=port, username=username, password=password)
+        self.scheduler = scheduler
+        self.cache = cache
+        self._cache_scope = f'{self.url}|{username}|'.encode('utf-8')
+        self._dumps = dumps
+        self._loads = loads
+        self._ids = count(1)
+        self._prefixes = {}
 
     def _request(self, payload: dict):
         """
-        Used internally to make RPC calls.
+        Used internally to make RPC calls from a full payload dict. Wrapped methods use `call` instead.
         :param payload: {method: method_name, params: params_values}
-        :return: { 'result': RESULT(json/dict/string/int/none), 'error': None, 'id': 'opid-GUID' }
+        :return: { 'result': RESULT(json/dict/string/int/none), 'error': None, 'id': request id }
         """
         if payload.get('jsonrpc', None) is None: payload['jsonrpc'] = '1.0'
-        if payload.get('id', None) is None: payload['id'] = str(uuid4())
-
-        _res = post(url=self.url, json=payload, auth=self.auth)
-        if _res.ok:
-            if _res.json() == 'null':
-                return None
-            return _res.json()
-        else:
-            raise ConnectionError(f'{_res.status_code} - {next(iter(status_codes._codes[_res.status_code]), None)}')
+        if payload.get('id', None) is None: payload['id'] = next(self._ids)
+
+        _res = self._loads(self._post(payload.get('method'), self._dumps(payload).encode('utf-8')))
+        if _res == 'null':
+            return None
+        return _res
+
+    def _post(self, method: str, body: bytes):
+        """
+        Used internally to send an encoded request, through the scheduler when one is set.
+        :param method: RPC method name, used to pick the priority class.
+        :param body: encoded JSON-RPC request
+        :return: response body bytes
+        """
+        if self.scheduler is None:
+            return self.transport.post(body)
+        with self.scheduler.slot(method):
+            return self.transport.post(body)
+
+    def _prefix(self, method: str):
+        """
+        Used internally to build and cache the encoded request prefix of a method.
+        :param method: RPC method name
+        :return: b'{"jsonrpc": "1.0", "method": "<method>", "params": '
+        """
+        prefix = self._prefixes[method] = f'{{"jsonrpc": "1.0", "method": {self._dumps(method)}, "params": '.encode('utf-8')
+        return prefix
+
+    def call(self, method: str, *params):
+        """
+        Generic RPC call, every wrapped method goes through here.\n
+        The request body is assembled from a cached per-method prefix, the JSON encoded params and a counter based id,
+        so no payload dict or uuid is created per call.
+
+        :param method: RPC method name as the node knows it (e.g. 'z_getbalance')
+        :param params: Positional RPC parameters.
+        :return: { 'result': RESULT(json/dict/string/int/none), 'error': None, 'id': request id }
+        """
+        if self.cache is not None and method in self.cache.policies:
+            return self._cached_call(method, params)
+        prefix = self._prefixes.get(method) or self._prefix(method)
+        body = b'%s%s, "id": %d}' % (prefix, self._dumps(params).encode('utf-8'), next(self._ids))
+        _res = self._loads(self._post(method, body))
+        if _res == 'null':
+            return None
+        return _res
+
+    def call_lazy(self, method: str, *params):
+        """
+        Like `call`, but the response is not decoded up front, for large results (z_listunspent, getalldata,
+        zs_listtransactions) where only a few entries are read. See pirate_chain_py.lazy.\n
+        The shared cache is not used.
+
+        :param method: RPC method name as the node knows it (e.g. 'z_listunspent')
+        :param params: Positional RPC parameters.
+        :return: LazyObject { 'result': ..., 'error': ..., 'id': ... }, small values and containers decode to plain Python
+        """
+        from pirate_chain_py.lazy import lazy_loads
+        prefix = self._prefixes.get(method) or self._prefix(method)
+        body = b'%s%s, "id": %d}' % (prefix, self._dumps(params).encode('utf-8'), next(self._ids))
+        return lazy_loads(self._post(method, body))
+
+    def _cached_call(self, method: str, params: tuple):
+        """
+        Used internally to serve a call from the shared cache, storing the result on a miss when the cache accepts it.
+        """
+        params_json = self._dumps(params).encode('utf-8')
+        key = b'%s%s%s' % (self._cache_scope, method.encode('utf-8'), params_json)
+        hit = self.cache.get(key)
+        if hit is not None:
+            return {'result': self._loads(hit), 'error': None, 'id': next(self._ids)}
+        prefix = self._prefixes.get(method) or self._prefix(method)
+        _res = self._loads(self._post(method, b'%s%s, "id": %d}' % (prefix, params_json, next(self._ids))))
+        if _res == 'null':
+            return None
+        if _res.get('error') is None and self.cache.cacheable(method, _res.get('result')):
+            self.cache.set(key, self._dumps(_res['result']).encode('utf-8'))
+        return _res
+
+    def call_batch(self, calls):
+        """
+        Sends several RPC calls in one JSON-RPC batch request.\n
+        With a scheduler set, the batch is admitted under the lowest priority class among its calls, so a bulk call
+        in a batch is held to the bulk in-flight cap and rate limit.
+
+        :param calls: List of (method, params) pairs, params being a list or tuple.
+        :return: List of { 'result': ..., 'error': ..., 'id': ... } in the order of `calls`.
+        """
+        if not calls:
+            return []
+        ids = []
+        parts = []
+        for method, params in calls:
+            _id = next(self._ids)
+            ids.append(_id)
+            parts.append(b'%s%s, "id": %d}' % (self._prefixes.get(method) or self._prefix(method), self._dumps(list(params)).encode('utf-8'), _id))
+        method = calls[0][0]
+        if self.scheduler is not None:
+            from pirate_chain_py.scheduler import PRIORITIES
+            method = max((m for m, _params in calls), key=lambda m: PRIORITIES.index(self.scheduler.classify(m)))
+        _res = self._loads(self._post(method, b'[' + b', '.join(parts) + b']'))
+        if not isinstance(_res, list):
+            raise ConnectionError(f'Batch request failed: {_res}')
+        by_id = {res.get('id'): res for res in _res}
+        return [by_id.get(_id) for _id in ids]
 
     def get_all_data(self, datatype: int, args=None):
         """
@@ -62,7 +177,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'getalldata', 'params': [datatype] + args})
+        return self.call('getalldata', datatype, *args)
 
     def zs_get_transaction(self, tx_id: str):
         """
@@ -78,7 +193,7 @@ class PirateWallet:
         :param tx_id: String transaction ID
         :return:
         """
-        return self._request(payload={'method': 'zs_gettransaction', 'params': [tx_id]})
+        return self.call('zs_gettransaction', tx_id)
 
     def zs_list_received_by_address(self, address: str, args=None):
         """
@@ -116,7 +231,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'zs_listreceivedbyaddress', 'params': [address] + args})
+        return self.call('zs_listreceivedbyaddress', address, *args)
 
     def zs_list_sent_by_address(self, address: str, args: list):
         """
@@ -152,7 +267,7 @@ class PirateWallet:
         :param args: Optional parameters.
         :return: JSON or None
         """
-        return self._request(payload={'method': 'zs_listsentbyaddress', 'params': [address] + args})
+        return self.call('zs_listsentbyaddress', address, *args)
 
     def zs_list_spent_by_address(self, address: str, args=None):
         """
@@ -190,7 +305,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'zs_listspentbyaddress', 'params': [address] + args})
+        return self.call('zs_listspentbyaddress', address, *args)
 
     def zs_list_transactions(self, args: list):
         """
@@ -226,7 +341,7 @@ class PirateWallet:
         :param args: Optional parameters.
         :return: JSON or None
         """
-        return self._request(payload={'method': 'zs_listtransactions', 'params': args})
+        return self.call('zs_listtransactions', *args)
 
     def z_build_raw_transaction(self, hex_string: str):
         """
@@ -242,7 +357,7 @@ class PirateWallet:
         :param hex_string: Required parameter.
         :return: JSON or None
         """
-        return self._request(payload={'method': 'z_buildrawtransaction', 'params': [hex_string]})
+        return self.call('z_buildrawtransaction', hex_string)
 
     def z_create_build_instructions(self, inputs: list, outputs: list, args=None):
         """
@@ -283,7 +398,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_createbuildinstructions', 'params': [inputs, outputs] + args})
+        return self.call('z_createbuildinstructions', inputs, outputs, *args)
 
     def z_export_key(self, z_address: str):
         """
@@ -302,7 +417,7 @@ class PirateWallet:
         :param z_address: Required parameter.
         :return:
         """
-        return self._request(payload={'method': 'z_exportkey', 'params': [z_address]})
+        return self.call('z_exportkey', z_address)
 
     def z_validate_address(self, z_address: str):
         """
@@ -332,7 +447,7 @@ class PirateWallet:
         :param z_address: Required parameter
         :return:
         """
-        return self._request(payload={'method': 'z_validateaddress', 'params': [z_address]})
+        return self.call('z_validateaddress', z_address)
 
     def z_export_viewing_key(self, z_address: str):
         """
@@ -350,7 +465,7 @@ class PirateWallet:
 
         :return:
         """
-        return self._request(payload={'method': 'z_exportviewingkey', 'params': [z_address]})
+        return self.call('z_exportviewingkey', z_address)
 
     def z_export_wallet(self, filename: str):
         """
@@ -370,7 +485,7 @@ class PirateWallet:
         :param filename: Required parameter
         :return:
         """
-        return self._request(payload={'method': 'z_exportwallet', 'params': [filename]})
+        return self.call('z_exportwallet', filename)
 
     def z_get_balance(self, address: str, args=None):
         """
@@ -394,7 +509,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_getbalance', 'params': [address] + args})
+        return self.call('z_getbalance', address, *args)
 
     def z_get_balances(self, args=None):
         """
@@ -422,7 +537,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_getbalances', 'params': args})
+        return self.call('z_getbalances', *args)
 
     def z_get_total_balance(self, args=None):
         """
@@ -448,7 +563,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_gettotalbalance', 'params': args})
+        return self.call('z_gettotalbalance', *args)
 
     def z_get_new_address(self):
         """
@@ -462,7 +577,7 @@ class PirateWallet:
 
         :return:
         """
-        return self._request(payload={'method': 'z_getnewaddress', 'params': []})
+        return self.call('z_getnewaddress')
 
     def z_get_new_address_key(self, address_type='sapling'):
         """
@@ -482,7 +597,7 @@ class PirateWallet:
         :return:
         """
         if address_type not in ('sprout', 'sapling'): TypeError(f'"address_type" has to be either "sprout" or "sapling". Got {address_type}')
-        return self._request(payload={'method': 'z_getnewaddresskey', 'params': [address_type]})
+        return self.call('z_getnewaddresskey', address_type)
 
     def z_get_operation_result(self, operation_ids=None):
         """
@@ -502,7 +617,7 @@ class PirateWallet:
         """
         if operation_ids is None: operation_ids = []
         if not isinstance(operation_ids, list): raise TypeError(f'"operation_ids" parameter should be a list of string - operation ids. Got {type(operation_ids)} instead.')
-        return self._request(payload={'method': 'z_getoperationresult', 'params': [operation_ids]})
+        return self.call('z_getoperationresult', operation_ids)
 
     def z_get_operation_status(self, operation_ids=None):
         """
@@ -521,7 +636,7 @@ class PirateWallet:
         :return:
         """
         if operation_ids is None: operation_ids = []
-        return self._request(payload={'method': 'z_getoperationstatus', 'params': [operation_ids]})
+        return self.call('z_getoperationstatus', operation_ids)
 
     def z_import_key(self, z_key: str, args=None):
         """
@@ -542,7 +657,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_importkey', 'params': [z_key] + args})
+        return self.call('z_importkey', z_key, *args)
 
     def z_import_viewing_key(self, v_key: str, args=None):
         """
@@ -570,7 +685,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_importviewingkey', 'params': [v_key] + args})
+        return self.call('z_importviewingkey', v_key, *args)
 
     def z_import_wallet(self, filename: str):
         """
@@ -586,7 +701,7 @@ class PirateWallet:
         :param filename: Required parameter.
         :return:
         """
-        return self._request(payload={'method': 'z_importwallet', 'params': [filename]})
+        return self.call('z_importwallet', filename)
 
     def z_list_addresses(self, args=None):
         """
@@ -609,7 +724,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_listaddresses', 'params': args})
+        return self.call('z_listaddresses', *args)
 
     def z_list_operation_ids(self, args=None):
         """
@@ -632,7 +747,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_listoperationids', 'params': args})
+        return self.call('z_listoperationids', *args)
 
     def z_list_received_by_address(self, address: str, args=None):
         """
@@ -663,7 +778,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_listreceivedbyaddress', 'params': [address] + args})
+        return self.call('z_listreceivedbyaddress', address, *args)
 
     def z_list_unspent(self, args=None):
         """
@@ -708,7 +823,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_listunspent', 'params': args})
+        return self.call('z_listunspent', *args)
 
     def z_merge_to_address(self, from_addresses: list, to_address: str, args=None):
         """
@@ -762,7 +877,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_mergetoaddress', 'params': [from_addresses, to_address] + args})
+        return self.call('z_mergetoaddress', from_addresses, to_address, *args)
 
     def z_send_many(self, from_address: str, amounts: list, args=None):
         """
@@ -798,7 +913,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_sendmany', 'params': [from_address, amounts] + args})
+        return self.call('z_sendmany', from_address, amounts, *args)
 
     def z_set_primary_spending_key(self, secret_extended_key: str):
         # TODO: Find out wtf this is :?    ... also the method called in the docs is "z_getnewaddress" hmm
@@ -818,7 +933,7 @@ class PirateWallet:
         :param secret_extended_key: aka. extended spending key
         :return:
         """
-        return self._request(payload={'method': 'z_getnewaddress', 'params': [secret_extended_key]})
+        return self.call('z_getnewaddress', secret_extended_key)
 
     def z_shield_coinbase(self, from_taddr: str, to_zaddrr: str, args=None):
         """
@@ -857,7 +972,7 @@ class PirateWallet:
         """
         if args is None: args = []
         if not isinstance(args, list): raise TypeError(f'"args" parameter should be a list of optional parameters. Got {type(args)} instead.')
-        return self._request(payload={'method': 'z_shieldcoinbase', 'params': [from_taddr, to_zaddrr, ] + args})
+        return self.call('z_shieldcoinbase', from_taddr, to_zaddrr, *args)
 
     def z_view_transaction(self, tx_id: str):
         """
@@ -908,7 +1023,7 @@ class PirateWallet:
         :param tx_id: Required parameter.
         :return:
         """
-        return self._request(payload={'method': 'z_viewtransaction', 'params': [tx_id]})
+        return self.call('z_viewtransaction', tx_id)
 
     def backup_wallet(self, destination: str):
         """
@@ -926,4 +1041,4 @@ class PirateWallet:
         :param destination: Required parameter.
         :return:
         """
-        return self._request(payload={'method': 'backupwallet', 'params': [destination]})
+        return self.call('backupwallet', destination)
@@ -0,0 +1,229 @@
+"""
+Client side size and fee planning for z_sendmany and z_mergetoaddress.
+
+Both calls return an operation id right away and only fail later, in z_getoperationresult, when the transaction they
+build is too big or cannot be funded. The planner repeats the node's note selection (largest notes first) on the
+z_listunspent result, estimates the size of every transaction and splits payouts into transactions that fit, or
+rejects them, before anything is submitted.
+
+Sizes are for Sapling v4 transactions: 384 bytes per spend, 948 bytes per output (the memo is always included),
+at least 2 Sapling outputs once there is a spend, and 200000 bytes at most.
+"""
+
+from bisect import bisect_left
+from itertools import accumulate
+
+from pirate_chain_py.units import ZATS, output_index, to_zat
+
+MAX_TX_SIZE = 200000
+TX_OVERHEAD = 100
+SPEND_SIZE = 384
+OUTPUT_SIZE = 948
+T_INPUT_SIZE = 148
+T_OUTPUT_SIZE = 34
+MIN_SHIELDED_OUTPUTS = 2
+MEMO_SIZE = 512
+DEFAULT_FEE = 0.0001
+MERGE_SHIELDED_LIMIT = 90
+
+
+def estimate_size(spends: int, outputs: int, t_inputs: int = 0, t_outputs: int = 0):
+    """
+    Estimates the serialized size of a transaction.
+    :param spends: Sapling notes spent.
+    :param outputs: Sapling outputs, change included. Padded to 2 when there is a spend.
+    :param t_inputs: Transparent inputs.
+    :param t_outputs: Transparent outputs.
+    :return: bytes
+    """
+    if spends and outputs < MIN_SHIELDED_OUTPUTS:
+        outputs = MIN_SHIELDED_OUTPUTS
+    return TX_OVERHEAD + spends * SPEND_SIZE + outputs * OUTPUT_SIZE + t_inputs * T_INPUT_SIZE + t_outputs * T_OUTPUT_SIZE
+
+
+def spendable_notes(wallet, address: str, minconf: int = 1):
+    """
+    Fetches the notes z_sendmany can spend from an address.
+    :param wallet: PirateWallet
+    :param address: Sending z-address.
+    :param minconf: Same minconf as the z_sendmany call.
+    :return: z_listunspent entries
+    """
+    response = wallet.z_list_unspent([minconf, 9999999, False, [address]])
+    if response is None or response.get('error') is not None:
+        raise ConnectionError(f'z_listunspent failed: {response and response.get("error")}')
+    return [note for note in response['result'] or [] if note.get('spendable', True)]
+
+
+def _payout_error(payout):
+    """
+    Used internally to check one z_sendmany amounts entry.
+    :return: reason string or None
+    """
+    if not isinstance(payout, dict) or not isinstance(payout.get('address'), str):
+        return 'expected {"address": ..., "amount": ...}'
+    if not isinstance(payout.get('amount'), (int, float)) or payout['amount'] <= 0:
+        return f'invalid amount {payout.get("amount")!r}'
+    memo = payout.get('memo')
+    if memo is not None:
+        if not payout['address'].startswith('zs'):
+            return 'memo to a transparent address'
+        if len(memo) > 2 * MEMO_SIZE:
+            return f'memo is {len(memo) // 2} bytes, at most {MEMO_SIZE}'
+    return None
+
+
+class _NotePool:
+    """
+    Used internally to hand out notes largest first, the way the node selects them.
+    """
+    def __init__(self, notes):
+        self.notes = sorted(notes, key=to_zat, reverse=True)
+        self.prefix = [0] + list(accumulate(to_zat(note) for note in self.notes))
+        self.used = 0
+
+    def select(self, target: int):
+        """
+        :return: number of notes needed to cover `target` zats, None when the remaining notes are not enough
+        """
+        needed = bisect_left(self.prefix, self.prefix[self.used] + target, self.used) - self.used
+        return needed if self.used + needed < len(self.prefix) else None
+
+    def value(self, count: int):
+        return self.prefix[self.used + count] - self.prefix[self.used]
+
+    def take(self, count: int):
+        taken = self.notes[self.used:self.used + count]
+        self.used += count
+        return taken
+
+
+def _shape(amount: int, shielded: int, transparent: int, pool: _NotePool, fee: int, fee_per_kb: int):
+    """
+    Used internally to size one transaction paying `amount` zats to the given outputs from the pool.
+    :return: (inputs, size, fee zats, change zats), inputs None when the pool cannot fund it
+    """
+    tx_fee = fee
+    while True:
+        inputs = pool.select(amount + tx_fee)
+        if inputs is None:
+            return None, None, tx_fee, 0
+        change = pool.value(inputs) - amount - tx_fee
+        size = estimate_size(inputs, shielded + (change > 0), t_outputs=transparent)
+        size_fee = max(fee, -(-size // 1000) * fee_per_kb)
+        if size_fee <= tx_fee:
+            return inputs, size, tx_fee, change
+        tx_fee = size_fee
+
+
+def plan_send(notes, payouts, fee: float = DEFAULT_FEE, fee_per_kb: float = 0.0, max_size: int = MAX_TX_SIZE,
+              max_outputs: int = None, minconf: int = 1):
+    """
+    Splits payouts into z_sendmany calls that fit in a transaction and can be funded from `notes`.\n
+    Payouts keep their order. Notes are assigned to one transaction each (largest first), so the planned transactions
+    can be submitted together; change only comes back after confirmation and is not counted.
+
+    :param notes: Spendable notes of the sending address (see `spendable_notes`).
+    :param payouts: z_sendmany amounts list, [{"address", "amount", "memo"}].
+    :param fee: Fee per transaction in ARRR.
+    :param fee_per_kb: Optional minimum fee in ARRR per started 1000 bytes, the larger of both is used.
+    :param max_size: Largest transaction to build, in bytes.
+    :param max_outputs: Optional cap on payouts per transaction.
+    :param minconf: minconf passed to z_sendmany, the notes should have been listed with the same value.
+    :return: {'transactions': [{'amounts', 'args', 'fee', 'inputs', 'notes', 'outputs', 'size', 'change'}],
+              'rejected': [{'payout', 'reason'}], 'fee': total fee in ARRR}
+             Each transaction is z_send_many(from_address, tx['amounts'], tx['args']).
+    """
+    pool = _NotePool(notes)
+    fee_zat = int(round(fee * ZATS))
+    fee_per_kb_zat = int(round(fee_per_kb * ZATS))
+    transactions = []
+    rejected = []
+    batch = []
+    amount = shielded = 0
+    total_fee = 0
+
+    def _close():
+        nonlocal total_fee
+        inputs, size, tx_fee, change = _shape(amount, shielded, len(batch) - shielded, pool, fee_zat, fee_per_kb_zat)
+        taken = pool.take(inputs)
+        total_fee += tx_fee
+        transactions.append({'amounts': batch, 'args': [minconf, tx_fee / ZATS], 'fee': tx_fee / ZATS, 'inputs': inputs,
+                             'notes': [(note['txid'], output_index(note)) for note in taken],
+                             'outputs': len(batch) + (change > 0), 'size': size, 'change': change / ZATS})
+
+    for payout in payouts:
+        reason = _payout_error(payout)
+        if reason is not None:
+            rejected.append({'payout': payout, 'reason': reason})
+            continue
+        zats = to_zat(payout)
+        is_shielded = payout['address'].startswith('zs')
+        if batch and (max_outputs is None or len(batch) < max_outputs):
+            inputs, size, _fee, _change = _shape(amount + zats, shielded + is_shielded, len(batch) + 1 - shielded - is_shielded,
+                                                 pool, fee_zat, fee_per_kb_zat)
+            if inputs is not None and size <= max_size:
+                batch.append(payout)
+                amount += zats
+                shielded += is_shielded
+                continue
+        if batch:
+            _close()
+            batch = []
+            amount = shielded = 0
+        inputs, size, _fee, _change = _shape(zats, int(is_shielded), int(not is_shielded), pool, fee_zat, fee_per_kb_zat)
+        if inputs is None:
+            rejected.append({'payout': payout, 'reason': 'insufficient funds in the remaining notes'})
+        elif size > max_size:
+            rejected.append({'payout': payout, 'reason': f'needs {inputs} notes ({size} bytes, at most {max_size}), '
+                                                         f'merge notes first (z_mergetoaddress)'})
+        else:
+            batch.append(payout)
+            amount = zats
+            shielded = int(is_shielded)
+    if batch:
+        _close()
+    return {'transactions': transactions, 'rejected': rejected, 'fee': total_fee / ZATS}
+
+
+def plan_merge(notes, fee: float = DEFAULT_FEE, shielded_limit: int = MERGE_SHIELDED_LIMIT, max_size: int = MAX_TX_SIZE):
+    """
+    Splits notes into z_mergetoaddress calls of at most `shielded_limit` notes that fit in a transaction.\n
+    The node picks which notes each call merges, the plan bounds how many per call and how many calls are needed.
+    Notes are grouped smallest first, groups worth no more than the fee are rejected. The node refuses to merge a
+    single note, so a lone trailing note takes one note from the group before it, or is rejected when that is not
+    possible.
+
+    :param notes: Spendable notes to merge.
+    :param fee: Fee per transaction in ARRR.
+    :param shielded_limit: Notes per transaction, same as the z_mergetoaddress parameter (0 fits as many as possible).
+    :param max_size: Largest transaction to build, in bytes.
+    :return: {'transactions': [{'notes', 'inputs', 'size', 'value', 'fee', 'args'}], 'rejected': [{'notes', 'reason'}]}
+             `args` is [fee, 0, shielded_limit] for z_mergetoaddress.
+    """
+    fee_zat = int(round(fee * ZATS))
+    per_tx = (max_size - estimate_size(0, MIN_SHIELDED_OUTPUTS)) // SPEND_SIZE
+    if shielded_limit:
+        per_tx = min(per_tx, shielded_limit)
+    if per_tx < 2:
+        raise ValueError(f'max_size {max_size} and shielded_limit {shielded_limit} allow {max(per_tx, 0)} notes per '
+                         f'merge, at least 2 are needed')
+    ordered = sorted(notes, key=to_zat)
+    starts = list(range(0, len(ordered), per_tx))
+    if len(ordered) % per_tx == 1 and len(starts) > 1 and per_tx > 2:
+        starts[-1] -= 1
+    transactions = []
+    rejected = []
+    for start, end in zip(starts, starts[1:] + [len(ordered)]):
+        group = ordered[start:end]
+        value = sum(to_zat(note) for note in group)
+        ids = [(note['txid'], output_index(note)) for note in group]
+        if len(group) == 1:
+            rejected.append({'notes': ids, 'reason': 'a single note, there is nothing to merge it with'})
+            continue
+        if value <= fee_zat:
+            rejected.append({'notes': ids, 'reason': f'merged value {value / ZATS} does not cover the fee {fee}'})
+            continue
+        transactions.append({'notes': ids, 'inputs': len(group), 'size': estimate_size(len(group), 1),
+                             'value': (value - fee_zat) / ZATS, 'fee': fee, 'args': [fee, 0, len(group)]})
+    return {'transactions': transactions, 'rejected': rejected}
@@ -0,0 +1,225 @@
+"""
+Parallel per-address history reconciliation, for audits over every wallet address.
+
+Addresses are sharded across worker processes, each with its own PirateWallet and keep-alive connection. For every
+address a worker fetches zs_listreceivedbyaddress, zs_listsentbyaddress, zs_listspentbyaddress and z_getbalance and
+reduces them to a small summary in arrrtoshis, so only summaries cross the process boundary. The parent merges the
+summaries as they stream in and flags addresses whose received - spent differs from z_getbalance.
+
+Usage:
+    python -m pirate_chain_py.reconcile [--conf ~/.komodo/PIRATE/PIRATE.conf] [-p 8] > audit.ndjson
+"""
+
+import sys
+import time
+
+from pirate_chain_py.units import ZATS, output_index, to_zat
+
+_wallet = None
+_ERRORS = (ConnectionError, OSError, KeyError, TypeError, ValueError)
+
+
+def _result(response, method: str):
+    """
+    Used internally to unwrap an RPC response, raising on RPC errors.
+    """
+    if response is None or response.get('error') is not None:
+        raise ConnectionError(f'{method} failed: {response and response.get("error")}')
+    return response['result']
+
+
+def summarize(wallet, address: str, minconf: int = 0):
+    """
+    Fetches the history of one address and reduces it to totals.
+    :param wallet: PirateWallet
+    :param address: Wallet address.
+    :param minconf: Minimum confirmations for the history and the balance.
+    :return: {'address', 'received', 'sent', 'spent', 'balance', 'drift', 'notes', 'spends', 'orphan_spends', 'transactions'}
+             amounts in arrrtoshis, drift = balance - (received - spent)
+    """
+    received_txs = _result(wallet.zs_list_received_by_address(address, [minconf]), 'zs_listreceivedbyaddress') or []
+    sent_txs = _result(wallet.zs_list_sent_by_address(address, [minconf]), 'zs_listsentbyaddress') or []
+    spent_txs = _result(wallet.zs_list_spent_by_address(address, [minconf]), 'zs_listspentbyaddress') or []
+    balance = int(round(_result(wallet.z_get_balance(address, [minconf]), 'z_getbalance') * ZATS))
+
+    notes = set()
+    received = 0
+    for tx in received_txs:
+        for out in tx.get('received', ()):
+            if out.get('address', address) == address:
+                notes.add((tx['txid'], output_index(out)))
+                received += to_zat(out)
+    sent = sum(to_zat(out) for tx in sent_txs for out in tx.get('sent', ()))
+    spent = 0
+    spends = orphans = 0
+    for tx in spent_txs:
+        for spend in tx.get('spends', ()):
+            if spend.get('address', address) != address:
+                continue
+            spends += 1
+            spent += to_zat(spend)
+            if (spend.get('txidPrev'), spend.get('outputPrev', spend.get('jsOutputPrev'))) not in notes:
+                orphans += 1
+    txids = {tx['txid'] for tx in received_txs} | {tx['txid'] for tx in sent_txs} | {tx['txid'] for tx in spent_txs}
+    return {'address': address, 'received': received, 'sent': sent, 'spent': spent, 'balance': balance,
+            'drift': balance - (received - spent), 'notes': len(notes), 'spends': spends, 'orphan_spends': orphans,
+            'transactions': len(txids)}
+
+
+def _init_worker(ip: str, port: str, username: str, password: str, minconf: int):
+    """
+    Used internally to open one wallet connection per worker process.
+    """
+    global _wallet
+    from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+    _wallet = (PirateWallet(ip=ip, port=port, username=username, password=password), minconf)
+
+
+def _work(address: str):
+    """
+    Used internally to summarize one address in a worker, errors are returned rather than raised.
+    """
+    wallet, minconf = _wallet
+    try:
+        return summarize(wallet, address, minconf)
+    except _ERRORS as e:
+        return {'address': address, 'error': f'{type(e).__name__}: {e}'}
+
+
+def _consistent(summary: dict):
+    """
+    Used internally to check a summary.
+    """
+    return summary.get('error') is None and summary['drift'] == 0 and summary['orphan_spends'] == 0
+
+
+class Reconciler:
+    """
+    Reconciles the history of many addresses across worker processes.\n
+    A mismatch can also come from a transaction landing between the calls for an address, so mismatched addresses
+    are checked once more in the parent (`recheck`) before being reported.
+    """
+    def __init__(self, ip: str, port: str, username: str, password: str, processes: int = 4, minconf: int = 0,
+                 chunksize: int = 4):
+        """
+        :param ip: RPC host of the node
+        :param port: RPC port of the node
+        :param username: rpcuser from PIRATE.conf
+        :param password: rpcpassword from PIRATE.conf
+        :param processes: Worker processes, each keeps one connection. Keep it at or below the node's -rpcthreads.
+        :param minconf: Minimum confirmations for histories and balances, 0 includes the mempool.
+        :param chunksize: Addresses handed to a worker at a time.
+        """
+        from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+        if processes < 1: raise ValueError(f'"processes" has to be at least 1. Got {processes}')
+        self._conn = (ip, port, username, password)
+        self.processes = processes
+        self.minconf = minconf
+        self.chunksize = chunksize
+        self.wallet = PirateWallet(ip=ip, port=port, username=username, password=password)
+
+    def addresses(self):
+        """
+        :return: Every shielded address of the wallet (z_listaddresses).
+        """
+        return _result(self.wallet.z_list_addresses(), 'z_listaddresses') or []
+
+    def summaries(self, addresses=None):
+        """
+        Streams per-address summaries in completion order.
+        :param addresses: Addresses to reconcile, defaults to every wallet address.
+        :return: iterator of summary dicts (see `summarize`), or {'address', 'error'} for addresses that failed
+        """
+        from multiprocessing import Pool
+        addresses = list(self.addresses() if addresses is None else addresses)
+        with Pool(min(self.processes, max(1, len(addresses))), initializer=_init_worker,
+                  initargs=self._conn + (self.minconf,)) as pool:
+            yield from pool.imap_unordered(_work, addresses, self.chunksize)
+
+    def run(self, addresses=None, on_result=None, progress=None, interval: float = 1.0, recheck: bool = True):
+        """
+        Reconciles addresses and merges the results.
+        :param addresses: Addresses to reconcile, defaults to every wallet address.
+        :param on_result: Optional function(summary) called for every address as its summary arrives.
+        :param progress: Optional stream for throughput reports (e.g. sys.stderr), at most every `interval` seconds.
+        :param interval: Seconds between progress reports.
+        :param recheck: Summarize mismatched addresses once more before reporting them.
+        :return: {'addresses': n, 'totals': {field: arrrtoshis}, 'inconsistent': [summary], 'errors': [summary],
+                  'elapsed': seconds, 'rate': addresses per second}
+        """
+        addresses = list(self.addresses() if addresses is None else addresses)
+        totals = dict.fromkeys(('received', 'sent', 'spent', 'balance'), 0)
+        inconsistent = []
+        errors = []
+        done = 0
+        started = last = time.monotonic()
+
+        def _report(label):
+            elapsed = time.monotonic() - started
+            progress.write(f'{label}: {done}/{len(addresses)} addresses, {len(inconsistent)} inconsistent, '
+                           f'{len(errors)} errors, {elapsed:.1f}s, {done / elapsed if elapsed else 0.0:.1f} addresses/s\n')
+            progress.flush()
+
+        for summary in self.summaries(addresses):
+            done += 1
+            if summary.get('error') is not None:
+                errors.append(summary)
+            else:
+                for field in totals:
+                    totals[field] += summary[field]
+                if not _consistent(summary):
+                    inconsistent.append(summary)
+            if on_result is not None:
+                on_result(summary)
+            if progress is not None and time.monotonic() - last >= interval:
+                last = time.monotonic()
+                _report('progress')
+
+        if recheck and inconsistent:
+            confirmed = []
+            for summary in inconsistent:
+                try:
+                    again = summarize(self.wallet, summary['address'], self.minconf)
+                except _ERRORS as e:
+                    again = dict(summary, error=f'recheck: {type(e).__name__}: {e}')
+                if not _consistent(again):
+                    confirmed.append(again)
+                for field in totals:
+                    totals[field] += again.get(field, summary[field]) - summary[field]
+            inconsistent = confirmed
+        elapsed = time.monotonic() - started
+        if progress is not None:
+            _report('done')
+        return {'addresses': done, 'totals': totals, 'inconsistent': inconsistent, 'errors': errors,
+                'elapsed': elapsed, 'rate': done / elapsed if elapsed else 0.0}
+
+
+def main(argv=None):
+    """
+    Command line entry point, see the module docstring. Writes one NDJSON line per address and a final totals line.
+    """
+    from argparse import ArgumentParser
+    from json import dumps
+    from pirate_chain_py.cli import add_connection_arguments, resolve_connection
+    parser = ArgumentParser(prog='python -m pirate_chain_py.reconcile', description='Reconcile the history of every wallet address.')
+    parser.add_argument('addresses', nargs='*', help='addresses to check, every wallet address when omitted')
+    add_connection_arguments(parser)
+    parser.add_argument('-p', '--processes', type=int, default=4, help='worker processes')
+    parser.add_argument('--minconf', type=int, default=0)
+    parser.add_argument('-q', '--quiet', action='store_true', help='no progress on stderr')
+    args = parser.parse_args(argv)
+
+    try:
+        ip, port, username, password = resolve_connection(args)
+    except ValueError as e:
+        parser.error(str(e))
+    reconciler = Reconciler(ip, port, username, password, processes=args.processes, minconf=args.minconf)
+    report = reconciler.run(args.addresses or None, on_result=lambda summary: print(dumps(summary), flush=True),
+                            progress=None if args.quiet else sys.stderr)
+    print(dumps({'totals': report['totals'], 'inconsistent': [s['address'] for s in report['inconsistent']],
+                 'errors': [s['address'] for s in report['errors']], 'elapsed': report['elapsed']}))
+    return 1 if report['inconsistent'] or report['errors'] else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,398 @@
+"""
+Record and replay of RPC traffic, for load testing without a synced node.
+
+Recording wraps the wallet's transport and appends one line per request to a file:
+    {"t": unix time, "d": seconds, "q": request, "r": response}
+A failed call has "e": error text instead of "r", plus "s": HTTP status and "b": raw response body when the node
+answered with an error status, so refusals replay with the node's JSON-RPC error.
+Request and response are stored as the raw JSON the node saw, so nothing is re-encoded while recording.
+Calls that carry keys or passphrases (SECRET_METHODS) are not recorded unless asked for, and the file is created
+readable by its owner only.
+
+Usage:
+    python -m pirate_chain_py.replay serve traffic.ndjson --port 45453 [--latency]
+    python -m pirate_chain_py.replay drive traffic.ndjson --ip 127.0.0.1 --port 45453 --username u --password p --speed 10 --concurrency 8
+"""
+
+import os
+import re
+import threading
+import time
+from collections import deque
+from json import dumps, loads
+
+from pirate_chain_py.transport import HttpStatusError
+
+UNSAFE_METHODS = frozenset(('z_sendmany', 'z_mergetoaddress', 'z_shieldcoinbase', 'z_importkey', 'z_importviewingkey',
+                            'z_importwallet', 'z_exportwallet', 'backupwallet', 'z_getnewaddress', 'z_getnewaddresskey',
+                            'z_getoperationresult'))
+SECRET_METHODS = frozenset(('z_importkey', 'z_importviewingkey', 'z_exportkey', 'z_exportviewingkey', 'z_exportwallet',
+                            'z_importwallet', 'z_getnewaddresskey', 'dumpprivkey', 'importprivkey', 'dumpwallet',
+                            'importwallet', 'walletpassphrase', 'walletpassphrasechange', 'encryptwallet'))
+_METHOD = re.compile(rb'"method"\s*:\s*"([^"]+)"')
+
+
+class RecordingTransport:
+    """
+    Transport wrapper that appends every request, its response and its timing to an NDJSON file.
+    """
+    def __init__(self, transport, path: str, include_secrets: bool = False):
+        """
+        :param transport: Transport that actually talks to the node.
+        :param path: File to append the recording to, created with mode 0600.
+        :param include_secrets: Also record SECRET_METHODS calls (spending/viewing keys, passphrases) in clear.
+        """
+        self.transport = transport
+        self.path = path
+        self.include_secrets = include_secrets
+        self._file = os.fdopen(os.open(path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600), 'ab')
+        self._lock = threading.Lock()
+
+    def post(self, body: bytes):
+        """
+        Sends the request through the wrapped transport and records it.
+        :param body: encoded JSON-RPC request
+        :return: response body bytes
+        """
+        if not self.include_secrets and any(m.decode('utf-8', 'replace') in SECRET_METHODS for m in _METHOD.findall(body)):
+            return self.transport.post(body)
+        started = time.time()
+        t0 = time.perf_counter()
+        try:
+            res = self.transport.post(body)
+        except OSError as e:
+            status = b''
+            if isinstance(e, HttpStatusError):
+                status = b', "s": %d, "b": %s' % (e.status, dumps(e.body.decode('latin-1')).encode('utf-8'))
+            self._write(b'{"t": %.6f, "d": %.6f, "q": %s, "e": %s%s}\n' % (started, time.perf_counter() - t0, _one_line(body),
+                                                                          dumps(str(e)).encode('utf-8'), status))
+            raise
+        self._write(b'{"t": %.6f, "d": %.6f, "q": %s, "r": %s}\n' % (started, time.perf_counter() - t0, _one_line(body), _one_line(res)))
+        return res
+
+    def _write(self, line: bytes):
+        """
+        Used internally to append one record.
+        """
+        with self._lock:
+            self._file.write(line)
+
+    def flush(self):
+        """
+        Flushes buffered records to the file.
+        :return: None
+        """
+        with self._lock:
+            self._file.flush()
+
+    def close(self):
+        """
+        Flushes and closes the recording file, the wrapped transport stays open.
+        :return: None
+        """
+        with self._lock:
+            self._file.close()
+
+
+def _one_line(raw: bytes):
+    """
+    Used internally to make a JSON document fit on one line. Raw newlines in JSON can only be insignificant whitespace.
+    """
+    raw = raw.strip()
+    return raw.replace(b'\n', b' ').replace(b'\r', b' ') if b'\n' in raw or b'\r' in raw else raw
+
+
+def record(wallet, path: str, include_secrets: bool = False):
+    """
+    Starts recording the traffic of a wallet, calls in SECRET_METHODS are left out unless `include_secrets`.
+    :param wallet: PirateWallet instance
+    :param path: File to append the recording to.
+    :param include_secrets: Also record calls that carry keys or passphrases.
+    :return: The RecordingTransport now installed on the wallet. Call `.close()` on it and restore `.transport` to stop.
+    """
+    recorder = RecordingTransport(wallet.transport, path, include_secrets)
+    wallet.transport = recorder
+    return recorder
+
+
+def load(path: str):
+    """
+    Streams the records of a recording file.
+    :param path: Recording file.
+    :return: Iterator of dicts with keys t, d, q and r or e (with s and b for HTTP errors).
+    """
+    with open(path, 'rb') as f:
+        for line in f:
+            if line.strip():
+                yield loads(line)
+
+
+def _call_key(request):
+    """
+    Used internally to identify a request (or a batch of them) independently of its id.
+    """
+    if isinstance(request, list):
+        return tuple(_call_key(req) for req in request)
+    return request.get('method'), dumps(request.get('params', []), sort_keys=True)
+
+
+def _error_reply(rec: dict):
+    """
+    Used internally to turn the failure of a record into (HTTP status, body), status None for no answer at all.
+    :return: None when the call succeeded
+    """
+    error = rec.get('e')
+    if error is None:
+        return None
+    if 's' in rec:
+        return rec['s'], rec.get('b', '').encode('latin-1')
+    if error[:3].isdigit():
+        return int(error[:3]), b''
+    return None, b''
+
+
+class ReplayServer:
+    """
+    Local stand-in for a node that answers requests with recorded responses.\n
+    Requests are matched by method and params, repeated requests get the recorded responses in order and the last one
+    once they run out. Ids are rewritten to the incoming id. Unknown requests get a 404 with a JSON-RPC error, like the node.
+    Recorded HTTP errors are answered with their status and body as recorded, other recorded failures (timeouts, resets)
+    by closing the connection without an answer.
+    """
+    def __init__(self, path: str, ip: str = '127.0.0.1', port: int = 0, latency: bool = False, speed: float = 1.0):
+        """
+        :param path: Recording file.
+        :param ip: Address to listen on.
+        :param port: Port to listen on, 0 picks a free one (see `.port`).
+        :param latency: Sleep for the recorded duration (divided by speed) before answering.
+        :param speed: Latency divisor.
+        """
+        from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+        self.latency = latency
+        self.speed = speed
+        self._responses = {}
+        self._lock = threading.Lock()
+        for rec in load(path):
+            self._responses.setdefault(_call_key(rec['q']), deque()).append((rec.get('r'), _error_reply(rec), rec.get('d', 0.0)))
+
+        server = self
+
+        class _Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+            disable_nagle_algorithm = True
+
+            def do_POST(self):
+                body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+                status, out = server.answer(body)
+                if status is None:
+                    self.close_connection = True
+                    return
+                self.send_response(status)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(out)))
+                self.end_headers()
+                self.wfile.write(out)
+
+            def log_message(self, *args):
+                pass
+
+        self._server = ThreadingHTTPServer((ip, port), _Handler)
+        self._server.daemon_threads = True
+        self.ip, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def _next(self, key):
+        """
+        Used internally to pop the next recorded answer for a request key.
+        """
+        with self._lock:
+            answers = self._responses.get(key)
+            if not answers:
+                return None
+            return answers.popleft() if len(answers) > 1 else answers[0]
+
+    def answer(self, body: bytes):
+        """
+        Builds the reply to one request body.
+        :param body: encoded JSON-RPC request
+        :return: (HTTP status, response body)
+        """
+        request = loads(body)
+        if isinstance(request, list):
+            answer = self._next(_call_key(request))
+            if answer is None:
+                replies = [self.answer(dumps(req).encode('utf-8'))[1] for req in request]
+                return 200, b'[' + b','.join(replies) + b']'
+            status, out = self._reply(answer, None)
+            if status == 200:
+                responses = loads(out)
+                out = dumps([dict(res, id=req.get('id')) for res, req in zip(responses, request)]).encode('utf-8')
+            return status, out
+        answer = self._next(_call_key(request))
+        if answer is None:
+            return 404, dumps({'result': None, 'error': {'code': -32601, 'message': f'No recorded response for {request.get("method")}'},
+                               'id': request.get('id')}).encode('utf-8')
+        return self._reply(answer, request.get('id'))
+
+    def _reply(self, answer, request_id):
+        """
+        Used internally to turn a recorded answer into an HTTP reply.
+        """
+        response, error, duration = answer
+        if self.latency and duration:
+            time.sleep(duration / self.speed)
+        if error is not None:
+            return error
+        if isinstance(response, dict) and 'id' in response:
+            response = dict(response, id=request_id)
+        return 200, dumps(response).encode('utf-8')
+
+    def start(self):
+        """
+        Serves in a background thread.
+        :return: self
+        """
+        self._thread = threading.Thread(target=self._server.serve_forever, name='pirate-replay-server', daemon=True)
+        self._thread.start()
+        return self
+
+    def serve_forever(self):
+        """
+        Serves in the calling thread.
+        :return: None
+        """
+        self._server.serve_forever()
+
+    def stop(self):
+        """
+        Stops serving and closes the socket.
+        :return: None
+        """
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class ReplayStats:
+    """
+    Outcome of a replay run.
+    """
+    def __init__(self):
+        self.sent = 0
+        self.errors = 0
+        self.skipped = 0
+        self.elapsed = 0.0
+        self.max_lag = 0.0
+        self.latencies = []
+
+    def percentile(self, p: float):
+        """
+        :param p: Percentile between 0 and 100.
+        :return: Latency in seconds or None when nothing was sent.
+        """
+        if not self.latencies:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p / 100))]
+
+    def __repr__(self):
+        rate = self.sent / self.elapsed if self.elapsed else 0.0
+        return (f'ReplayStats(sent={self.sent}, errors={self.errors}, skipped={self.skipped}, elapsed={self.elapsed:.2f}s, '
+                f'rate={rate:.1f}/s, p50={self.percentile(50)}, p99={self.percentile(99)}, max_lag={self.max_lag:.3f}s)')
+
+
+def replay(path: str, transport, speed: float = 1.0, concurrency: int = 4, unsafe: bool = False):
+    """
+    Drives a recording against a node (or a ReplayServer) keeping the recorded request timing, sped up `speed` times.\n
+    At most `concurrency` requests are in flight; when all of them are busy the schedule slips and the slip is
+    reported as max_lag. Spending and wallet changing methods are skipped unless `unsafe` is set.
+
+    :param path: Recording file.
+    :param transport: Transport to send the requests through, e.g. HttpTransport.
+    :param speed: Rate multiplier, 2.0 replays twice as fast as recorded.
+    :param concurrency: Maximum requests in flight.
+    :param unsafe: Also replay methods listed in UNSAFE_METHODS.
+    :return: ReplayStats
+    """
+    from concurrent.futures import ThreadPoolExecutor
+    if speed <= 0: raise ValueError(f'"speed" has to be positive. Got {speed}')
+    stats = ReplayStats()
+    slots = threading.BoundedSemaphore(concurrency)
+    stats_lock = threading.Lock()
+
+    def _send(body):
+        t0 = time.perf_counter()
+        try:
+            transport.post(body)
+            failed = False
+        except (ConnectionError, OSError):
+            failed = True
+        finally:
+            slots.release()
+        with stats_lock:
+            stats.latencies.append(time.perf_counter() - t0)
+            stats.errors += failed
+
+    started = time.perf_counter()
+    first = None
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        for rec in load(path):
+            request = rec['q']
+            methods = [req.get('method') for req in request] if isinstance(request, list) else [request.get('method')]
+            if not unsafe and UNSAFE_METHODS.intersection(methods):
+                stats.skipped += 1
+                continue
+            if first is None:
+                first = rec['t']
+            due = started + (rec['t'] - first) / speed
+            wait = due - time.perf_counter()
+            if wait > 0:
+                time.sleep(wait)
+            slots.acquire()
+            stats.max_lag = max(stats.max_lag, time.perf_counter() - due)
+            stats.sent += 1
+            pool.submit(_send, dumps(request).encode('utf-8'))
+    stats.elapsed = time.perf_counter() - started
+    return stats
+
+
+def main(argv=None):
+    """
+    Command line entry point, see the module docstring.
+    """
+    from argparse import ArgumentParser
+    parser = ArgumentParser(prog='python -m pirate_chain_py.replay', description='Serve or drive recorded Pirate RPC traffic.')
+    sub = parser.add_subparsers(dest='command')
+    sub.required = True
+    serve = sub.add_parser('serve', help='answer requests from a recording')
+    serve.add_argument('path')
+    serve.add_argument('--ip', default='127.0.0.1')
+    serve.add_argument('--port', type=int, default=45453)
+    serve.add_argument('--latency', action='store_true', help='sleep for the recorded duration before answering')
+    serve.add_argument('--speed', type=float, default=1.0)
+    drive = sub.add_parser('drive', help='send a recording to a node')
+    drive.add_argument('path')
+    drive.add_argument('--ip', default='127.0.0.1')
+    drive.add_argument('--port', default='45453')
+    drive.add_argument('--username', required=True)
+    drive.add_argument('--password', required=True)
+    drive.add_argument('--speed', type=float, default=1.0)
+    drive.add_argument('--concurrency', type=int, default=4)
+    drive.add_argument('--unsafe', action='store_true', help='also replay spending and wallet changing methods')
+    args = parser.parse_args(argv)
+
+    if args.command == 'serve':
+        server = ReplayServer(args.path, ip=args.ip, port=args.port, latency=args.latency, speed=args.speed)
+        print(f'serving {args.path} on {server.ip}:{server.port}', flush=True)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+    else:
+        from pirate_chain_py.transport import HttpTransport
+        transport = HttpTransport(ip=args.ip, port=args.port, username=args.username, password=args.password)
+        print(replay(args.path, transport, speed=args.speed, concurrency=args.concurrency, unsafe=args.unsafe))
+        transport.close()
+
+
+if __name__ == '__main__':
+    main()
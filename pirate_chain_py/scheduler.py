@@ -0,0 +1,210 @@
+"""
+Client side RPC scheduling: priority classes, per-class token bucket rate limits and in-flight caps.
+
+The node serves RPC from a small pool of worker threads (-rpcthreads). Putting one RpcScheduler in front of every
+PirateWallet talking to the same node keeps bulk reads from occupying all of them while payouts wait.
+"""
+
+import threading
+import time
+from bisect import insort
+from contextlib import contextmanager
+from itertools import count
+
+SPEND = 'spend'
+STATUS = 'status'
+READ = 'read'
+BULK = 'bulk'
+PRIORITIES = (SPEND, STATUS, READ, BULK)
+
+DEFAULT_CLASSES = {
+    'z_sendmany': SPEND,
+    'z_mergetoaddress': SPEND,
+    'z_shieldcoinbase': SPEND,
+    'z_getoperationstatus': STATUS,
+    'z_getoperationresult': STATUS,
+    'z_listoperationids': STATUS,
+    'getalldata': BULK,
+    'zs_listtransactions': BULK,
+    'zs_listreceivedbyaddress': BULK,
+    'zs_listsentbyaddress': BULK,
+    'zs_listspentbyaddress': BULK,
+    'z_listreceivedbyaddress': BULK,
+    'z_listunspent': BULK,
+    'z_exportwallet': BULK,
+    'z_importwallet': BULK,
+}
+
+
+class TokenBucket:
+    """
+    Token bucket refilled at `rate` tokens per second up to `burst` tokens.
+    """
+    def __init__(self, rate: float, burst: float = None):
+        """
+        :param rate: Tokens added per second.
+        :param burst: Bucket size, defaults to max(1, rate).
+        """
+        if rate <= 0: raise ValueError(f'"rate" has to be positive. Got {rate}')
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate)
+        self._tokens = self.burst
+        self._last = time.monotonic()
+
+    def _refill(self, now: float):
+        """
+        Used internally to add the tokens earned since the last refill.
+        """
+        self._tokens = min(self.burst, self._tokens + (now - self._last) * self.rate)
+        self._last = now
+
+    def ready(self, now: float):
+        """
+        :param now: time.monotonic()
+        :return: True when a token can be taken.
+        """
+        self._refill(now)
+        return self._tokens >= 1.0
+
+    def take(self):
+        """
+        Takes one token, call `ready` first.
+        :return: None
+        """
+        self._tokens -= 1.0
+
+    def wait_time(self, now: float):
+        """
+        :param now: time.monotonic()
+        :return: Seconds until a token is available.
+        """
+        self._refill(now)
+        return max(0.0, (1.0 - self._tokens) / self.rate)
+
+
+class RpcScheduler:
+    """
+    Admits RPC calls by priority class (spend > status > read > bulk).\n
+    A call waits until a global in-flight slot is free, its class is under its own in-flight cap and its class' token
+    bucket has a token. Among the calls that could go, the highest priority (then oldest) goes first.
+    """
+    def __init__(self, max_in_flight: int = 4, rates=None, limits=None, classes=None):
+        """
+        :param max_in_flight: Calls allowed at the node at once, keep it at or below the node's -rpcthreads.
+        :param rates: {class: requests per second or (rate, burst)}. Classes not listed are not rate limited.
+        :param limits: {class: max in flight}. Defaults to half of max_in_flight for bulk, so bulk never holds every slot.
+        :param classes: {method: class} overrides on top of DEFAULT_CLASSES. Unlisted methods are 'read'.
+        """
+        if max_in_flight < 1: raise ValueError(f'"max_in_flight" has to be at least 1. Got {max_in_flight}')
+        self.max_in_flight = max_in_flight
+        self.classes = dict(DEFAULT_CLASSES, **(classes or {}))
+        for cls in set(self.classes.values()).union(rates or ()).union(limits or ()):
+            if cls not in PRIORITIES: raise ValueError(f'Unknown priority class {cls!r}, expected one of {PRIORITIES}')
+        self.limits = {BULK: max(1, max_in_flight // 2)}
+        self.limits.update(limits or {})
+        self._buckets = {}
+        for cls, rate in (rates or {}).items():
+            self._buckets[cls] = TokenBucket(*rate) if isinstance(rate, (tuple, list)) else TokenBucket(rate)
+        self._cond = threading.Condition()
+        self._seq = count()
+        self._waiting = []
+        self._in_flight = 0
+        self._class_in_flight = dict.fromkeys(PRIORITIES, 0)
+
+    def classify(self, method: str):
+        """
+        :param method: RPC method name.
+        :return: Priority class of the method.
+        """
+        return self.classes.get(method, READ)
+
+    def _eligible(self, now: float):
+        """
+        Used internally to pick the waiter that may go next, waiters are kept in priority order.
+        :return: (waiter or None, seconds until a rate limited waiter could go or None)
+        """
+        if self._in_flight >= self.max_in_flight:
+            return None, None
+        retry = None
+        for waiter in self._waiting:
+            cls = waiter[2]
+            if self._class_in_flight[cls] >= self.limits.get(cls, self.max_in_flight):
+                continue
+            bucket = self._buckets.get(cls)
+            if bucket is not None and not bucket.ready(now):
+                wait = bucket.wait_time(now)
+                retry = wait if retry is None else min(retry, wait)
+                continue
+            return waiter, None
+        return None, retry
+
+    def acquire(self, method: str, timeout: float = None):
+        """
+        Blocks until a call of `method` may be sent.
+        :param method: RPC method name.
+        :param timeout: Seconds to wait at most, None waits forever.
+        :return: The priority class, pass it to `release`.
+        """
+        cls = self.classify(method)
+        deadline = None if timeout is None else time.monotonic() + timeout
+        with self._cond:
+            waiter = (PRIORITIES.index(cls), next(self._seq), cls)
+            insort(self._waiting, waiter)
+            try:
+                while True:
+                    now = time.monotonic()
+                    chosen, retry = self._eligible(now)
+                    if chosen is waiter:
+                        self._waiting.remove(waiter)
+                        bucket = self._buckets.get(cls)
+                        if bucket is not None:
+                            bucket.take()
+                        self._in_flight += 1
+                        self._class_in_flight[cls] += 1
+                        self._cond.notify_all()
+                        return cls
+                    if deadline is not None:
+                        if now >= deadline:
+                            raise TimeoutError(f'Timed out waiting for an RPC slot for {method} ({cls})')
+                        retry = deadline - now if retry is None else min(retry, deadline - now)
+                    self._cond.wait(retry)
+            except BaseException:
+                if waiter in self._waiting:
+                    self._waiting.remove(waiter)
+                    self._cond.notify_all()
+                raise
+
+    def release(self, cls: str):
+        """
+        Frees the slot taken by `acquire`.
+        :param cls: Value returned by `acquire`.
+        :return: None
+        """
+        with self._cond:
+            self._in_flight -= 1
+            self._class_in_flight[cls] -= 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, method: str, timeout: float = None):
+        """
+        Context manager around acquire/release.
+        :param method: RPC method name.
+        :param timeout: Seconds to wait at most, None waits forever.
+        """
+        cls = self.acquire(method, timeout)
+        try:
+            yield cls
+        finally:
+            self.release(cls)
+
+    def stats(self):
+        """
+        :return: {'in_flight': n, 'waiting': n, 'classes': {class: {'in_flight': n, 'waiting': n}}}
+        """
+        with self._cond:
+            waiting = dict.fromkeys(PRIORITIES, 0)
+            for _prio, _seq, cls in self._waiting:
+                waiting[cls] += 1
+            return {'in_flight': self._in_flight, 'waiting': len(self._waiting),
+                    'classes': {cls: {'in_flight': self._class_in_flight[cls], 'waiting': waiting[cls]} for cls in PRIORITIES}}
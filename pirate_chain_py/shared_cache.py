@@ -0,0 +1,182 @@
+"""
+Response cache shared by every process on a host, in a memory-mapped file (Unix only).
+
+Meant for results that no longer change, by default deeply confirmed zs_gettransaction results. Worker processes map
+the same file, so a result fetched by one of them is served to all others from the page cache, without another RPC
+and without a per-process copy. PirateWallet scopes its keys to the node URL and rpcuser, so wallets of different
+nodes sharing the file never see each other's results.
+
+A cached result is served as it was stored: the `confirmations` of a cached zs_gettransaction result stay at the
+value they had when it was cached. Wallet dependent results such as z_validateaddress (`ismine` changes after a key
+import) are not cached by default.
+
+The file is a fixed size set-associative table: a key hashes to one set of `ways` slots and a full set evicts its
+least recently used slot. Entries bigger than a slot are not cached.
+"""
+
+import os
+import struct
+import threading
+import time
+from hashlib import blake2b
+
+MAGIC = b'PRCACHE1'
+_HEADER = struct.Struct('<8sIII')
+_SLOT = struct.Struct('<QQII')
+HEADER_SIZE = 64
+
+
+def _default_path():
+    """
+    Used internally to pick a location backed by memory when available.
+    """
+    import tempfile
+    base = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(base, f'pirate_chain_py-{os.getuid()}.cache')
+
+
+def _confirmed(min_confirmations: int):
+    """
+    Used internally to build a cache policy requiring a minimum number of confirmations.
+    """
+    def _policy(result):
+        return isinstance(result, dict) and (result.get('confirmations') or 0) >= min_confirmations
+    return _policy
+
+
+class SharedCache:
+    """
+    Cross-process cache of RPC results.\n
+    Pass it to PirateWallet(cache=...); only methods listed in `policies` are cached, and only when their policy
+    accepts the result. Open it in each worker after forking (e.g. gunicorn's post_fork), since forked processes
+    share the file lock of an inherited descriptor.
+    """
+    def __init__(self, path: str = None, slots: int = 8192, slot_size: int = 8192, ways: int = 8, policies=None,
+                 min_confirmations: int = 10):
+        """
+        :param path: Cache file, every process must use the same one. Defaults to a file in /dev/shm.
+        :param slots: Number of slots, the file is slots * slot_size bytes (sparse until used).
+        :param slot_size: Bytes per slot, including a 24 byte slot header and the key.
+        :param ways: Slots per set, a key can live in any slot of its set.
+        :param policies: {method: function(result) -> bool}. Defaults to zs_gettransaction once it has
+                         `min_confirmations` confirmations, its `confirmations` field is not updated afterwards.
+        :param min_confirmations: Confirmations for the default zs_gettransaction policy.
+        """
+        import fcntl
+        import mmap
+        if slots % ways: raise ValueError(f'"slots" has to be a multiple of "ways". Got {slots} and {ways}')
+        self.path = path or _default_path()
+        self.slots = slots
+        self.slot_size = slot_size
+        self.ways = ways
+        self.policies = policies if policies is not None else {'zs_gettransaction': _confirmed(min_confirmations)}
+        self._flock = fcntl.flock
+        self._fcntl = fcntl
+        self._lock = threading.Lock()
+        self._sets = slots // ways
+        size = HEADER_SIZE + slots * slot_size
+        self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+        self._flock(self._fd, fcntl.LOCK_EX)
+        try:
+            if os.fstat(self._fd).st_size == 0:
+                os.ftruncate(self._fd, size)
+                os.pwrite(self._fd, _HEADER.pack(MAGIC, slots, slot_size, ways), 0)
+            else:
+                magic, f_slots, f_slot_size, f_ways = _HEADER.unpack(os.pread(self._fd, _HEADER.size, 0))
+                if magic != MAGIC or (f_slots, f_slot_size, f_ways) != (slots, slot_size, ways):
+                    raise ValueError(f'{self.path} is not a cache file with {slots} slots of {slot_size} bytes in {ways} ways.')
+        finally:
+            self._flock(self._fd, fcntl.LOCK_UN)
+        self._map = mmap.mmap(self._fd, size)
+
+    def cacheable(self, method: str, result):
+        """
+        :param method: RPC method name.
+        :param result: `result` of a successful response.
+        :return: True when the result may be stored.
+        """
+        policy = self.policies.get(method)
+        return policy is not None and policy(result)
+
+    def _locate(self, key: bytes):
+        """
+        Used internally to hash a key and find its set.
+        :return: (key hash, offset of the first slot of the set)
+        """
+        digest = int.from_bytes(blake2b(key, digest_size=8).digest(), 'little') or 1
+        return digest, HEADER_SIZE + (digest % self._sets) * self.ways * self.slot_size
+
+    def get(self, key: bytes):
+        """
+        :param key: Cache key.
+        :return: Stored value bytes or None
+        """
+        digest, base = self._locate(key)
+        slot_size = self.slot_size
+        with self._lock:
+            self._flock(self._fd, self._fcntl.LOCK_SH)
+            try:
+                for offset in range(base, base + self.ways * slot_size, slot_size):
+                    h, stamp, key_len, value_len = _SLOT.unpack_from(self._map, offset)
+                    if h != digest or not stamp:
+                        continue
+                    start = offset + _SLOT.size
+                    if self._map[start:start + key_len] != key:
+                        continue
+                    struct.pack_into('<Q', self._map, offset + 8, time.monotonic_ns() or 1)
+                    return self._map[start + key_len:start + key_len + value_len]
+            finally:
+                self._flock(self._fd, self._fcntl.LOCK_UN)
+        return None
+
+    def set(self, key: bytes, value: bytes):
+        """
+        Stores a value, evicting the least recently used slot of the key's set when it is full.
+        :param key: Cache key.
+        :param value: Value bytes.
+        :return: False when the entry is too big for a slot.
+        """
+        if _SLOT.size + len(key) + len(value) > self.slot_size:
+            return False
+        digest, base = self._locate(key)
+        slot_size = self.slot_size
+        with self._lock:
+            self._flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                victim = None
+                oldest = None
+                for offset in range(base, base + self.ways * slot_size, slot_size):
+                    h, stamp, key_len, _value_len = _SLOT.unpack_from(self._map, offset)
+                    if h == digest and stamp and self._map[offset + _SLOT.size:offset + _SLOT.size + key_len] == key:
+                        victim = offset
+                        break
+                    if oldest is None or stamp < oldest:
+                        victim, oldest = offset, stamp
+                start = victim + _SLOT.size
+                _SLOT.pack_into(self._map, victim, 0, 0, 0, 0)
+                self._map[start:start + len(key) + len(value)] = key + value
+                _SLOT.pack_into(self._map, victim, digest, time.monotonic_ns() or 1, len(key), len(value))
+            finally:
+                self._flock(self._fd, self._fcntl.LOCK_UN)
+        return True
+
+    def clear(self):
+        """
+        Empties the cache for every process.
+        :return: None
+        """
+        with self._lock:
+            self._flock(self._fd, self._fcntl.LOCK_EX)
+            try:
+                for offset in range(HEADER_SIZE, HEADER_SIZE + self.slots * self.slot_size, self.slot_size):
+                    _SLOT.pack_into(self._map, offset, 0, 0, 0, 0)
+            finally:
+                self._flock(self._fd, self._fcntl.LOCK_UN)
+
+    def close(self):
+        """
+        Unmaps the cache file, the file itself is left for other processes.
+        :return: None
+        """
+        self._map.close()
+        os.close(self._fd)
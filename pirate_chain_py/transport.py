@@ -0,0 +1,242 @@
+"""
+HTTP transports used by PirateWallet to reach the node's RPC server.
+
+Nothing heavy is imported at module level: the socket module is only loaded when the first
+request is made and `requests` is only loaded when RequestsTransport is actually used.
+"""
+
+from binascii import b2a_base64
+
+
+_STATUS_NAMES = {400: 'bad_request', 401: 'unauthorized', 403: 'forbidden', 404: 'not_found', 405: 'method_not_allowed',
+                 500: 'internal_server_error', 503: 'service_unavailable'}
+
+
+def _status_name(status_code: int):
+    """
+    Used internally to name an HTTP status the same way `requests.status_codes` does.
+    :param status_code: HTTP status code
+    :return: lower case status name or None
+    """
+    if status_code in _STATUS_NAMES:
+        return _STATUS_NAMES[status_code]
+    from http import HTTPStatus
+    try:
+        return HTTPStatus(status_code).name.lower()
+    except ValueError:
+        return None
+
+
+class HttpStatusError(ConnectionError):
+    """
+    The node answered with an HTTP error status. komodod answers every RPC error with status 500 and the JSON-RPC
+    error in the body, so unlike other ConnectionErrors this means the request reached the node and was refused.
+    """
+    def __init__(self, status: int, body: bytes = b''):
+        super().__init__(f'{status} - {_status_name(status)}')
+        self.status = status
+        self.body = body
+
+    def rpc_error(self):
+        """
+        The node's JSON-RPC error, telling a refused request from an unclear outcome.
+        :return: error dict when the node refused the call (an error body, or 401/403), None when it is unknown whether
+                 the call went through.
+        """
+        if self.status in (401, 403):
+            return {'message': str(self)}
+        from json import loads
+        try:
+            body = loads(self.body)
+        except ValueError:
+            return None
+        return body.get('error') if isinstance(body, dict) else None
+
+
+class HttpTransport:
+    """
+    Lightweight HTTP/1.1 transport for the node's JSON-RPC server built directly on the socket module.\n
+    Avoids `http.client` (and the email/ssl packages it pulls in) since the RPC server only ever speaks plain HTTP.
+    One persistent keep-alive connection is kept per thread, connections of threads that exited are closed when a new
+    connection is opened. A request is written at most once: an idle connection the node closed is replaced before
+    writing, any failure after that is raised to the caller since the node may have run the call.
+    """
+    def __init__(self, ip: str, port: str, username: str, password: str, timeout=None):
+        self.ip = ip
+        self.port = int(port)
+        self.timeout = timeout
+        _auth = b2a_base64(f'{username}:{password}'.encode('latin-1'), newline=False).decode('ascii')
+        self._head = (f'POST / HTTP/1.1\r\nHost: {ip}:{port}\r\nAuthorization: Basic {_auth}\r\n'
+                      f'Content-Type: application/json\r\nConnection: keep-alive\r\nContent-Length: ').encode('latin-1')
+        self._connections = {}
+
+    def _connect(self):
+        """
+        Used internally to open a new connection for the calling thread.
+        :return: (socket, socket file object opened for reading and writing)
+        """
+        import socket
+        sock = socket.create_connection((self.ip, self.port), timeout=self.timeout)
+        sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        return sock, sock.makefile('rwb')
+
+    @staticmethod
+    def _stale(sock):
+        """
+        Used internally to check an idle keep-alive connection before reusing it. Between requests the node sends
+        nothing, so a readable socket means it was closed (EOF or reset) or is out of sync.
+        """
+        from select import select
+        try:
+            return bool(select([sock], [], [], 0)[0])
+        except (OSError, ValueError):
+            return True
+
+    def close(self):
+        """
+        Closes every connection held by this transport.
+        :return: None
+        """
+        connections, self._connections = self._connections, {}
+        for _thread, sock, conn in connections.values():
+            try:
+                conn.close()
+                sock.close()
+            except OSError:
+                pass
+
+    def post(self, body: bytes):
+        """
+        Sends one JSON-RPC request body and returns the raw response body.\n
+        A kept-alive connection the node closed while idle is re-opened before writing. Once the request was written
+        it is never sent again, a failure raises and the outcome of the call is unknown.
+
+        :param body: encoded JSON-RPC request
+        :return: response body bytes
+        """
+        from threading import current_thread
+        thread = current_thread()
+        ident = thread.ident
+        thread_conn, sock, conn = self._connections.get(ident, (None, None, None))
+        if thread_conn is thread and self._stale(sock):
+            self._drop(ident, conn)
+            thread_conn = None
+        if thread_conn is not thread:
+            self._evict()
+            sock, conn = self._connect()
+            self._connections[ident] = (thread, sock, conn)
+        try:
+            conn.write(self._head + str(len(body)).encode('ascii') + b'\r\n\r\n' + body)
+            conn.flush()
+            status_line = conn.readline()
+            if not status_line:
+                raise ConnectionResetError('connection closed by node')
+            status, keep_alive, data = self._read_response(conn, status_line)
+        except BaseException:
+            self._drop(ident, conn)
+            raise
+        if not keep_alive:
+            self._drop(ident, conn)
+        if status >= 400:
+            raise HttpStatusError(status, data)
+        return data
+
+    def _evict(self):
+        """
+        Used internally to close the connections of threads that exited.
+        """
+        for ident, (thread, _sock, conn) in list(self._connections.items()):
+            if not thread.is_alive():
+                self._drop(ident, conn)
+
+    def _drop(self, ident, conn):
+        """
+        Used internally to forget a connection that can not be reused.
+        """
+        entry = self._connections.get(ident)
+        if entry is not None and entry[2] is conn:
+            self._connections.pop(ident, None)
+        try:
+            conn.close()
+            if entry is not None and entry[2] is conn:
+                entry[1].close()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _read_response(conn, status_line: bytes):
+        """
+        Used internally to read a response once its status line arrived.
+        :return: (status code, keep alive, body)
+        """
+        parts = status_line.split(None, 2)
+        if len(parts) < 2 or not parts[0].startswith(b'HTTP/'):
+            raise ConnectionError(f'Malformed response from node: {status_line[:80]!r}')
+        status = int(parts[1])
+        keep_alive = parts[0] == b'HTTP/1.1'
+        length = None
+        chunked = False
+        while True:
+            line = conn.readline()
+            if line in (b'\r\n', b'\n', b''):
+                break
+            name, _, value = line.partition(b':')
+            name = name.strip().lower()
+            value = value.strip().lower()
+            if name == b'content-length':
+                length = int(value)
+            elif name == b'transfer-encoding':
+                chunked = b'chunked' in value
+            elif name == b'connection':
+                keep_alive = value == b'keep-alive' or (keep_alive and value != b'close')
+        if chunked:
+            chunks = []
+            while True:
+                size = int(conn.readline().split(b';', 1)[0], 16)
+                if size == 0:
+                    while conn.readline() not in (b'\r\n', b'\n', b''):
+                        pass
+                    break
+                chunks.append(conn.read(size))
+                conn.readline()
+            data = b''.join(chunks)
+        elif length is not None:
+            data = conn.read(length)
+            if len(data) < length:
+                raise ConnectionResetError('connection closed by node mid response')
+        else:
+            data = conn.read()
+            keep_alive = False
+        return status, keep_alive, data
+
+
+class RequestsTransport:
+    """
+    Transport built on `requests`, for setups that need its proxy/TLS handling.
+    `requests` is imported when the transport is created, not when the package is imported.
+    """
+    def __init__(self, ip: str, port: str, username: str, password: str, timeout=None):
+        from requests import Session
+        self.url = f'http://{ip}:{port}'
+        self.timeout = timeout
+        self.session = Session()
+        self.session.auth = (username, password)
+        self.session.headers['Content-Type'] = 'application/json'
+
+    def close(self):
+        """
+        Closes the underlying requests session.
+        :return: None
+        """
+        self.session.close()
+
+    def post(self, body: bytes):
+        """
+        Sends one JSON-RPC request body and returns the raw response body.
+        :param body: encoded JSON-RPC request
+        :return: response body bytes
+        """
+        _res = self.session.post(url=self.url, data=body, timeout=self.timeout)
+        if _res.ok:
+            return _res.content
+        raise HttpStatusError(_res.status_code, _res.content)
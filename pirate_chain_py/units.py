@@ -0,0 +1,29 @@
+"""
+Amount and note entry helpers shared by the modules that read notes out of RPC results.
+"""
+
+ZATS = 100000000
+
+
+def to_zat(entry: dict):
+    """
+    Reads the value of a note, output or spend entry in arrrtoshis.
+    :param entry: Entry with valueZat/amountZat, or value/amount in ARRR.
+    :return: int
+    """
+    for key in ('valueZat', 'amountZat'):
+        if key in entry:
+            return int(entry[key])
+    return int(round(entry.get('value', entry.get('amount', 0)) * ZATS))
+
+
+def output_index(entry: dict):
+    """
+    Reads the output index of a note or output entry, the field name differs between RPC methods.
+    :param entry: Entry from z_listunspent, zs_gettransaction, zs_listreceivedbyaddress, ...
+    :return: int or None
+    """
+    for key in ('outindex', 'output', 'outputIndex', 'jsoutindex', 'jsOutput'):
+        if key in entry:
+            return entry[key]
+    return None
@@ -1,4 +1,4 @@
-from distutils.core import setup
+from setuptools import setup
 
 with open('README.rst') as readme:
     long_description = readme.read()
@@ -10,6 +10,7 @@ setup(
     license='MIT',
     description='''Pirate Chain, the most anonymous cryptocurrency in existence now with python wrapped Remote Procedure Calls for easy integration with any python based program. https://pirate.black/''',
     long_description=long_description,
+    entry_points={'console_scripts': ['pirate-rpc=pirate_chain_py.cli:main']},
     author='Mr_Idjit',
     author_email='mr_idjit@protonmail.com',
     url='https://github.com/Mr1djit/pirate_chain_py',
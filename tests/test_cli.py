@@ -0,0 +1,40 @@
+import io
+import json
+
+from pirate_chain_py.cli import run
+from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+from pirate_chain_py.transport import HttpStatusError
+
+
+class RefusingNode:
+    """
+    Transport answering every call the way komodod refuses one: HTTP 500 with the JSON-RPC error in the body.
+    """
+    def post(self, body):
+        raise HttpStatusError(500, json.dumps({'result': None, 'error': {'code': -8, 'message': 'Invalid txid'},
+                                               'id': 1}).encode())
+
+
+class DeadNode:
+    def post(self, body):
+        raise ConnectionResetError('reset')
+
+
+def _run(transport, batch_size):
+    out = io.StringIO()
+    calls, errors = run(PirateWallet('127.0.0.1', '1', 'u', 'p', transport=transport),
+                        ['{"method": "zs_gettransaction", "params": ["x"]}', '{"method": "getinfo"}'], out,
+                        batch_size=batch_size)
+    return [json.loads(line) for line in out.getvalue().splitlines()], errors
+
+
+def test_node_error_is_written_for_single_calls():
+    results, errors = _run(RefusingNode(), 1)
+    assert errors == 2
+    assert [result['error'] for result in results] == [{'code': -8, 'message': 'Invalid txid'}] * 2
+
+
+def test_transport_error_is_written_as_message():
+    results, errors = _run(DeadNode(), 2)
+    assert errors == 2
+    assert [result['error'] for result in results] == [{'message': 'reset'}] * 2
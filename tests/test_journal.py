@@ -0,0 +1,149 @@
+import json
+import os
+
+import pytest
+
+from pirate_chain_py.journal import SendJournal
+from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+from pirate_chain_py.transport import HttpStatusError
+
+AMOUNTS = [{'address': 'zs1to', 'amount': 1.5}]
+
+
+class FakeNode:
+    """
+    Transport answering z_sendmany with a new opid, z_getoperationstatus from `operations` and z_getoperationresult
+    by removing finished operations from `operations`, like the node.
+    """
+    def __init__(self):
+        self.sends = 0
+        self.operations = {}
+        self.fail = None
+
+    def post(self, body):
+        request = json.loads(body)
+        if request['method'] == 'z_sendmany':
+            if self.fail is not None:
+                raise self.fail
+            self.sends += 1
+            result = f'opid-{self.sends}'
+        elif request['method'] == 'z_getoperationresult':
+            result = [self.operations.pop(opid) for opid in request['params'][0]
+                      if self.operations.get(opid, {}).get('status') in ('success', 'failed', 'cancelled')]
+        else:
+            result = [self.operations[opid] for opid in request['params'][0] if opid in self.operations]
+        return json.dumps({'result': result, 'error': None, 'id': request['id']}).encode()
+
+    def close(self):
+        pass
+
+
+@pytest.fixture
+def node():
+    return FakeNode()
+
+
+@pytest.fixture
+def journal(node, tmp_path):
+    journal = SendJournal(PirateWallet('127.0.0.1', '1', 'u', 'p', transport=node), str(tmp_path / 'payouts.journal'))
+    yield journal
+    journal.close()
+
+
+def test_key_is_required(journal):
+    with pytest.raises(ValueError):
+        journal.send(None, 'zs1from', AMOUNTS)
+
+
+def test_same_key_sends_once(journal, node):
+    first = journal.send('payout-1', 'zs1from', AMOUNTS)
+    again = journal.send('payout-1', 'zs1from', AMOUNTS)
+    assert node.sends == 1
+    assert first == again
+    assert first['state'] == 'submitted' and first['opid'] == 'opid-1'
+
+
+def test_identical_payouts_with_different_keys_are_both_sent(journal, node):
+    journal.send('payout-1', 'zs1from', AMOUNTS)
+    journal.send('payout-2', 'zs1from', AMOUNTS)
+    assert node.sends == 2
+
+
+def test_key_reuse_with_other_payload_is_refused(journal):
+    journal.send('payout-1', 'zs1from', AMOUNTS)
+    with pytest.raises(ValueError):
+        journal.send('payout-1', 'zs1from', [{'address': 'zs1to', 'amount': 2}])
+
+
+def test_rpc_error_is_failed_and_retried_with_same_key(journal, node):
+    body = json.dumps({'result': None, 'error': {'code': -6, 'message': 'Insufficient funds'}, 'id': 1}).encode()
+    node.fail = HttpStatusError(500, body)
+    entry = journal.send('payout-1', 'zs1from', AMOUNTS)
+    assert entry['state'] == 'failed' and entry['error']['code'] == -6
+    node.fail = None
+    entry = journal.send('payout-1', 'zs1from', AMOUNTS)
+    assert entry['state'] == 'submitted' and entry['error'] is None
+    assert node.sends == 1
+
+
+def test_transport_error_is_unknown_and_not_retried(journal, node):
+    node.fail = ConnectionResetError('reset')
+    with pytest.raises(ConnectionError):
+        journal.send('payout-1', 'zs1from', AMOUNTS)
+    node.fail = None
+    assert journal.send('payout-1', 'zs1from', AMOUNTS)['state'] == 'unknown'
+    assert node.sends == 0
+
+
+def test_recover_state_transitions(journal, node):
+    for key in ('done', 'refused', 'running', 'lost'):
+        journal.send(key, 'zs1from', [{'address': 'zs1to', 'amount': 1, 'memo': key}])
+    journal._append({'k': 'crashed', 's': 'intent', 'hash': 'h'}, durable=True)
+    node.operations = {'opid-1': {'id': 'opid-1', 'status': 'success', 'result': {'txid': 'ab' * 32}},
+                       'opid-2': {'id': 'opid-2', 'status': 'failed', 'error': {'message': 'tx too large'}},
+                       'opid-3': {'id': 'opid-3', 'status': 'executing'}}
+    changed = journal.recover()
+    assert sorted(changed) == ['crashed', 'done', 'lost', 'refused']
+    assert journal.get('done')['state'] == 'success' and journal.get('done')['txid'] == 'ab' * 32
+    assert journal.get('refused')['state'] == 'failed'
+    assert journal.get('running')['state'] == 'submitted'
+    assert journal.get('lost')['state'] == 'unknown'
+    assert journal.get('crashed')['state'] == 'unknown'
+    assert [entry['key'] for entry in journal.outstanding()] == ['running', 'lost', 'crashed']
+
+
+def test_finish_records_results_the_node_then_forgets(journal, node, tmp_path):
+    journal.send('p1', 'zs1from', AMOUNTS)
+    journal.send('p2', 'zs1from', [{'address': 'zs1to', 'amount': 2}])
+    node.operations = {'opid-1': {'id': 'opid-1', 'status': 'success', 'result': {'txid': 'cd' * 32}},
+                       'opid-2': {'id': 'opid-2', 'status': 'executing'}}
+    assert list(journal.finish()) == ['p1']
+    assert 'opid-1' not in node.operations
+    assert journal.get('p1')['state'] == 'success' and journal.get('p1')['txid'] == 'cd' * 32
+    assert journal.finish() == {}
+
+    journal.close()
+    reopened = SendJournal(PirateWallet('127.0.0.1', '1', 'u', 'p', transport=node), str(tmp_path / 'payouts.journal'))
+    assert list(reopened.recover()) == []
+    assert reopened.get('p1')['state'] == 'success'
+    assert reopened.get('p2')['state'] == 'submitted'
+    reopened.close()
+
+
+def test_reopen_restores_entries_and_truncates_torn_tail(node, tmp_path):
+    path = str(tmp_path / 'payouts.journal')
+    journal = SendJournal(PirateWallet('127.0.0.1', '1', 'u', 'p', transport=node), path)
+    journal.send('payout-1', 'zs1from', AMOUNTS)
+    journal.close()
+    size = os.path.getsize(path)
+    with open(path, 'ab') as f:
+        f.write(b'{"k":"payout-2","s":"int')
+
+    reopened = SendJournal(PirateWallet('127.0.0.1', '1', 'u', 'p', transport=node), path)
+    assert os.path.getsize(path) == size
+    assert reopened.get('payout-1')['state'] == 'submitted'
+    assert reopened.get('payout-2') is None
+    reopened.send('payout-2', 'zs1from', AMOUNTS)
+    reopened.close()
+    with open(path, 'rb') as f:
+        assert all(json.loads(line) for line in f)
@@ -0,0 +1,26 @@
+import json
+
+from pirate_chain_py.lazy import MATCH_WINDOW, lazy_loads
+
+
+def test_values_longer_than_match_window():
+    doc = {'result': [{'hex': 'ab' * MATCH_WINDOW, 'n': 1}, {'hex': 'a\\"\\\\' * MATCH_WINDOW, 'n': 2}, 0.0] +
+                     [{'k': i, 'pad': 'x' * 100} for i in range(100)]}
+    long_number = b'0.' + b'0' * MATCH_WINDOW + b'1'
+    result = lazy_loads(json.dumps(doc).encode().replace(b'0.0', long_number, 1))['result']
+    assert len(result) == 103
+    assert result[0].decode() == doc['result'][0]
+    assert result[1]['hex'] == doc['result'][1]['hex']
+    assert result[2] == 0.0
+    assert result[-1] == {'k': 99, 'pad': 'x' * 100}
+
+
+def test_escapes_and_nesting():
+    doc = {'result': [{'memo': 'a\\"b\\\\' if i % 3 else 'plain', 'nested': {'a': [1, [2, {'b': 'x"y'}]]}, 'pad': 'x' * 50}
+                      for i in range(200)], 'error': None, 'id': 7}
+    raw = json.dumps(doc).encode()
+    response = lazy_loads(raw)
+    assert response.raw == raw
+    assert response['id'] == 7 and response['error'] is None
+    assert list(response['result']) == doc['result']
+    assert response['result'][10:12] == doc['result'][10:12]
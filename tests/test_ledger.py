@@ -0,0 +1,78 @@
+import pytest
+
+from pirate_chain_py.ledger import BalanceLedger
+
+BLOCK = 'b1' * 32
+NEXT = 'b2' * 32
+
+
+class FakeWallet:
+    def __init__(self, notes):
+        self.notes = notes
+
+    def z_list_unspent(self, args):
+        return {'result': self.notes, 'error': None, 'id': 1}
+
+
+def _note(txid, amount, confirmations, address='zs1a', outindex=0):
+    return {'txid': txid, 'outindex': outindex, 'address': address, 'amount': amount, 'confirmations': confirmations}
+
+
+def _tx(txid, amount, confirmations, blockhash=None, spends=(), address='zs1a'):
+    tx = {'txid': txid, 'confirmations': confirmations, 'spends': list(spends),
+          'received': [{'address': address, 'outindex': 0, 'value': amount}]}
+    if blockhash is not None:
+        tx['blockhash'] = blockhash
+    return tx
+
+
+@pytest.fixture
+def ledger():
+    wallet = FakeWallet([_note('t1', 1.0, 0), _note('t2', 2.0, 1), _note('t3', 4.0, 3, address='zs1b')])
+    return BalanceLedger(wallet, depths=(0, 1, 2, 3)).seed()
+
+
+def test_seed_fills_buckets_by_depth(ledger):
+    assert [ledger.total(d) for d in (0, 1, 2, 3)] == [7.0, 6.0, 4.0, 4.0]
+    assert ledger.balances(1) == {'zs1a': 2.0, 'zs1b': 4.0}
+    with pytest.raises(ValueError):
+        ledger.balance('zs1a', minconf=10)
+
+
+def test_advance_moves_notes_into_deeper_buckets(ledger):
+    ledger.advance(1)
+    assert [ledger.balance('zs1a', d) for d in (0, 1, 2, 3)] == [3.0, 2.0, 2.0, 0.0]
+    ledger.advance(1)
+    assert ledger.balance('zs1a', 3) == 2.0
+    ledger.advance(5)
+    assert ledger.balance('zs1a', 3) == 2.0 and ledger.balance('zs1a', 1) == 2.0
+
+
+def test_observe_confirms_and_spends(ledger):
+    ledger.observe_transaction(_tx('t1', 1.0, 1))
+    assert ledger.balance('zs1a', 1) == 3.0
+    ledger.observe_transaction(_tx('t4', 0.5, 0, spends=[{'txidPrev': 't3', 'outputPrev': 0, 'address': 'zs1b'}]))
+    assert ledger.balance('zs1b', 0) == 0.0 and ledger.total(3) == 0.0
+    assert ledger.balance('zs1a', 0) == 3.5 and ledger.balance('zs1a', 1) == 3.0
+    ledger.observe_transaction(_tx('t4', 0.5, 0))
+    assert ledger.balance('zs1a', 0) == 3.5
+
+
+@pytest.mark.parametrize('wallet_first', [True, False])
+def test_mined_transaction_is_counted_from_its_block(ledger, wallet_first):
+    mined = _tx('t5', 8.0, 1, blockhash=BLOCK)
+    if wallet_first:
+        ledger.observe_transaction(mined)
+        assert ledger.balance('zs1a', 0) == 11.0 and ledger.balance('zs1a', 1) == 2.0
+        ledger.advance(1, BLOCK)
+    else:
+        ledger.advance(1, BLOCK)
+        ledger.observe_transaction(mined)
+    assert [ledger.balance('zs1a', d) for d in (0, 1, 2)] == [11.0, 10.0, 2.0]
+    ledger.advance(1, NEXT)
+    assert [ledger.balance('zs1a', d) for d in (1, 2, 3)] == [10.0, 10.0, 2.0]
+
+
+def test_reconcile_reports_drift(ledger):
+    ledger.wallet.notes = [_note('t2', 2.0, 1)]
+    assert ledger.reconcile() == {'zs1a': {0: (3 * 10 ** 8, 2 * 10 ** 8)}, 'zs1b': {d: (4 * 10 ** 8, 0) for d in (0, 1, 2, 3)}}
@@ -0,0 +1,31 @@
+from pirate_chain_py.memo import MemoIndex, decode_memo
+
+
+def _hex(text):
+    return (text.encode('utf-8') + b'\x00' * (512 - len(text.encode('utf-8')))).hex()
+
+
+def test_decode_memo():
+    assert decode_memo(_hex('invoice-42')) == 'invoice-42'
+    assert decode_memo('f6' + '00' * 511) is None
+    assert decode_memo(None) is None
+
+
+def test_re_adding_replaces_outputs():
+    index = MemoIndex()
+    notes = [{'txid': 't1', 'outindex': 0, 'address': 'zs1a', 'amount': 1.0, 'memo': _hex('invoice-42')},
+             {'txid': 't1', 'outindex': 1, 'address': 'zs1a', 'amount': 2.0, 'memoStr': ' invoice-43 '},
+             {'txid': 't2', 'received': [{'outindex': 0, 'address': 'zs1b', 'value': 3.0, 'memo': _hex('invoice-42')}]}]
+    assert index.add(notes) == 3
+    assert index.add(notes) == 3
+    assert len(index) == 3
+    assert sorted(row['txid'] for row in index.lookup('invoice-42')) == ['t1', 't2']
+    assert index.lookup('invoice-43')[0]['zat'] == 200000000
+    index.close()
+
+
+def test_entries_without_output_index_are_skipped():
+    index = MemoIndex()
+    assert index.add([{'txid': 't1', 'address': 'zs1a', 'amount': 1.0, 'memoStr': 'invoice-42'}]) == 0
+    assert len(index) == 0
+    index.close()
@@ -0,0 +1,49 @@
+import os
+import socket
+import stat
+import threading
+
+import pytest
+
+from pirate_chain_py.notify import NotifyListener, send
+
+TXID = 'ab' * 32
+
+
+class FakeWallet:
+    def call(self, method, txid):
+        return {'result': {'txid': txid}, 'error': None, 'id': 1}
+
+
+def test_socket_is_private_and_delivers_events(tmp_path):
+    path = str(tmp_path / 'notify.sock')
+    received = threading.Event()
+    events = []
+    listener = NotifyListener(FakeWallet(), socket_path=path)
+    listener.subscribe(lambda kind, ident, data: (events.append((kind, ident, data)), received.set()))
+    listener.start()
+    try:
+        assert stat.S_IMODE(os.stat(path).st_mode) == 0o600
+        send('wallet', TXID, socket_path=path)
+        assert received.wait(5)
+        assert events == [('wallet', TXID, {'txid': TXID})]
+    finally:
+        listener.stop()
+    assert not os.path.exists(path)
+
+
+def test_stale_socket_is_replaced(tmp_path):
+    path = str(tmp_path / 'notify.sock')
+    stale = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    stale.bind(path)
+    stale.close()
+    listener = NotifyListener(FakeWallet(), socket_path=path).start()
+    listener.stop()
+
+
+def test_other_files_are_not_removed(tmp_path):
+    path = tmp_path / 'PIRATE.conf'
+    path.write_text('rpcuser=u\n')
+    with pytest.raises(FileExistsError):
+        NotifyListener(FakeWallet(), socket_path=str(path))
+    assert path.read_text() == 'rpcuser=u\n'
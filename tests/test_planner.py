@@ -0,0 +1,35 @@
+import pytest
+
+from pirate_chain_py.planner import SPEND_SIZE, estimate_size, plan_merge
+
+
+def _notes(count, amount=1.0):
+    return [{'txid': f'{i:064x}', 'outindex': 0, 'amount': amount} for i in range(count)]
+
+
+def test_merge_groups_respect_limit():
+    plan = plan_merge(_notes(10), shielded_limit=4)
+    assert [tx['inputs'] for tx in plan['transactions']] == [4, 4, 2]
+    assert plan['rejected'] == []
+
+
+def test_merge_moves_a_note_to_a_lone_trailing_note():
+    plan = plan_merge(_notes(9), shielded_limit=4)
+    assert [tx['inputs'] for tx in plan['transactions']] == [4, 3, 2]
+    assert sum(len(tx['notes']) for tx in plan['transactions']) == 9
+
+
+def test_merge_rejects_a_single_note():
+    plan = plan_merge(_notes(1))
+    assert plan['transactions'] == []
+    assert len(plan['rejected']) == 1
+    plan = plan_merge(_notes(3), shielded_limit=2)
+    assert [tx['inputs'] for tx in plan['transactions']] == [2]
+    assert len(plan['rejected']) == 1
+
+
+@pytest.mark.parametrize('max_size, shielded_limit', [(estimate_size(0, 2) + SPEND_SIZE - 1, 90),
+                                                      (estimate_size(0, 2) + SPEND_SIZE, 90), (200000, 1)])
+def test_merge_without_room_for_two_notes_raises(max_size, shielded_limit):
+    with pytest.raises(ValueError):
+        plan_merge(_notes(5), shielded_limit=shielded_limit, max_size=max_size)
@@ -0,0 +1,26 @@
+from pirate_chain_py.reconcile import Reconciler
+
+
+class MalformedWallet:
+    """
+    Answers every history call with a result missing its fields.
+    """
+    def _bad(self, *args):
+        return {'result': [{'received': [{'value': 1}]}], 'error': None, 'id': 1}
+
+    zs_list_received_by_address = zs_list_sent_by_address = zs_list_spent_by_address = _bad
+
+    def z_get_balance(self, address, args=None):
+        return {'result': 1.0, 'error': None, 'id': 1}
+
+
+def test_recheck_errors_are_reported_not_raised():
+    reconciler = Reconciler('127.0.0.1', '1', 'u', 'p', processes=1)
+    reconciler.wallet = MalformedWallet()
+    drifted = {'address': 'zs1a', 'received': 0, 'sent': 0, 'spent': 0, 'balance': 1, 'drift': 1, 'notes': 0,
+               'spends': 0, 'orphan_spends': 0, 'transactions': 0}
+    reconciler.summaries = lambda addresses: iter([drifted])
+    report = reconciler.run(['zs1a'])
+    assert [summary['address'] for summary in report['inconsistent']] == ['zs1a']
+    assert report['inconsistent'][0]['error'].startswith('recheck: KeyError')
+    assert report['totals']['balance'] == 1
@@ -0,0 +1,67 @@
+import json
+import os
+import socket
+
+import pytest
+
+from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+from pirate_chain_py.replay import ReplayServer, load, record
+from pirate_chain_py.transport import HttpStatusError, HttpTransport
+
+REFUSAL = json.dumps({'result': None, 'error': {'code': -6, 'message': 'Insufficient funds'}, 'id': 1}).encode()
+
+
+class ScriptedNode:
+    """
+    Transport answering getinfo, refusing z_sendmany like komodod and timing out on z_getbalance.
+    """
+    def post(self, body):
+        method = json.loads(body)['method']
+        if method == 'z_sendmany':
+            raise HttpStatusError(500, REFUSAL)
+        if method == 'z_getbalance':
+            raise socket.timeout('timed out')
+        if method == 'z_exportkey':
+            return b'{"result": "secret-extended-key", "error": null, "id": 1}'
+        return b'{"result": {"blocks": 10}, "error": null, "id": 1}'
+
+
+@pytest.fixture
+def recording(tmp_path):
+    path = str(tmp_path / 'traffic.ndjson')
+    wallet = PirateWallet('127.0.0.1', '1', 'u', 'p', transport=ScriptedNode())
+    recorder = record(wallet, path)
+    wallet.call('getinfo')
+    with pytest.raises(HttpStatusError):
+        wallet.z_send_many('zs1from', [{'address': 'zs1to', 'amount': 1}])
+    with pytest.raises(OSError):
+        wallet.z_get_balance('zs1from')
+    wallet.z_export_key('zs1from')
+    recorder.close()
+    return path
+
+
+def test_recording_is_private_and_leaves_out_keys(recording):
+    assert os.stat(recording).st_mode & 0o777 == 0o600
+    records = list(load(recording))
+    assert [rec['q']['method'] for rec in records] == ['getinfo', 'z_sendmany', 'z_getbalance']
+    assert records[1]['s'] == 500 and records[1]['b'].encode('latin-1') == REFUSAL
+    assert 's' not in records[2] and records[2]['e'] == 'timed out'
+
+
+def test_replay_serves_recorded_errors(recording):
+    server = ReplayServer(recording)
+    server.start()
+    wallet = PirateWallet(server.ip, server.port, 'u', 'p', transport=HttpTransport(server.ip, server.port, 'u', 'p', timeout=5))
+    try:
+        assert wallet.call('getinfo')['result'] == {'blocks': 10}
+        with pytest.raises(HttpStatusError) as e:
+            wallet.z_send_many('zs1from', [{'address': 'zs1to', 'amount': 1}])
+        assert e.value.status == 500 and e.value.body == REFUSAL
+        assert e.value.rpc_error() == {'code': -6, 'message': 'Insufficient funds'}
+        with pytest.raises(ConnectionError) as e:
+            wallet.z_get_balance('zs1from')
+        assert not isinstance(e.value, HttpStatusError)
+    finally:
+        wallet.transport.close()
+        server.stop()
@@ -0,0 +1,34 @@
+import json
+
+from pirate_chain_py.pirate_rpc_wallet import PirateWallet
+from pirate_chain_py.scheduler import BULK, READ, RpcScheduler
+
+
+class ObservingNode:
+    """
+    Transport recording which classes were in flight while each request was sent.
+    """
+    def __init__(self, scheduler):
+        self.scheduler = scheduler
+        self.seen = []
+
+    def post(self, body):
+        self.seen.append({cls for cls, n in self.scheduler._class_in_flight.items() if n})
+        request = json.loads(body)
+        return json.dumps([{'result': None, 'error': None, 'id': req['id']} for req in request]).encode()
+
+
+def test_batch_is_admitted_under_its_lowest_class():
+    scheduler = RpcScheduler(max_in_flight=4)
+    node = ObservingNode(scheduler)
+    wallet = PirateWallet('127.0.0.1', '1', 'u', 'p', transport=node, scheduler=scheduler)
+    wallet.call_batch([('z_validateaddress', ['zs1a']), ('getalldata', [0])])
+    wallet.call_batch([('z_validateaddress', ['zs1a']), ('getinfo', [])])
+    assert node.seen == [{BULK}, {READ}]
+
+
+def test_classify():
+    scheduler = RpcScheduler(classes={'getinfo': BULK})
+    assert scheduler.classify('z_sendmany') == 'spend'
+    assert scheduler.classify('getinfo') == BULK
+    assert scheduler.classify('z_validateaddress') == READ
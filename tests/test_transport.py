@@ -0,0 +1,120 @@
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+from pirate_chain_py.transport import HttpStatusError, HttpTransport
+
+
+class Handler(BaseHTTPRequestHandler):
+    """
+    Echoes the request body back, shaped by the server's `mode`.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers['Content-Length']))
+        self.server.requests.append((self.client_address, body))
+        mode = self.server.mode
+        if mode == 'reset':
+            self.connection.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+            self.close_connection = True
+            return
+        self.send_response(500 if mode == 'error' else 200)
+        if mode == 'chunked':
+            self.send_header('Transfer-Encoding', 'chunked')
+            self.end_headers()
+            for start in range(0, len(body), 3):
+                chunk = body[start:start + 3]
+                self.wfile.write(b'%x;ext=1\r\n%s\r\n' % (len(chunk), chunk))
+            self.wfile.write(b'0\r\n\r\n')
+            return
+        self.send_header('Content-Length', str(len(body)))
+        if mode == 'close':
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(body)
+        if mode == 'idle_close':
+            self.close_connection = True
+
+
+@pytest.fixture
+def server():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+    server.daemon_threads = True
+    server.requests = []
+    server.mode = 'length'
+    thread = threading.Thread(target=server.serve_forever, args=(0.01,), daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def transport(server):
+    transport = HttpTransport('127.0.0.1', server.server_address[1], 'user', 'pass', timeout=5)
+    yield transport
+    transport.close()
+
+
+def _clients(server):
+    return {client for client, _body in server.requests}
+
+
+@pytest.mark.parametrize('mode', ['length', 'chunked'])
+def test_keep_alive_connection_is_reused(server, transport, mode):
+    server.mode = mode
+    assert transport.post(b'{"id": 1}') == b'{"id": 1}'
+    assert transport.post(b'{"id": 2, "long": "' + b'x' * 10000 + b'"}').endswith(b'x"}')
+    assert len(_clients(server)) == 1
+
+
+def test_connection_close_opens_a_new_connection(server, transport):
+    server.mode = 'close'
+    transport.post(b'{"id": 1}')
+    assert transport._connections == {}
+    transport.post(b'{"id": 2}')
+    assert len(_clients(server)) == 2
+
+
+def test_error_status_carries_the_body(server, transport):
+    server.mode = 'error'
+    with pytest.raises(HttpStatusError) as e:
+        transport.post(b'{"error": {"code": -8}}')
+    assert e.value.status == 500 and e.value.body == b'{"error": {"code": -8}}'
+    assert str(e.value) == '500 - internal_server_error'
+
+
+def test_idle_connection_closed_by_node_is_replaced_before_writing(server, transport):
+    server.mode = 'idle_close'
+    transport.post(b'{"id": 1}')
+    time.sleep(0.1)
+    server.mode = 'length'
+    assert transport.post(b'{"id": 2}') == b'{"id": 2}'
+    assert [body for _client, body in server.requests] == [b'{"id": 1}', b'{"id": 2}']
+
+
+def test_request_is_not_sent_again_after_a_reset(server, transport):
+    transport.post(b'{"id": 1}')
+    server.mode = 'reset'
+    with pytest.raises(ConnectionError):
+        transport.post(b'{"method": "z_sendmany"}')
+    assert [body for _client, body in server.requests].count(b'{"method": "z_sendmany"}') == 1
+    server.mode = 'length'
+    assert transport.post(b'{"id": 3}') == b'{"id": 3}'
+
+
+def test_connections_of_exited_threads_are_evicted(server, transport):
+    worker = threading.Thread(target=transport.post, args=(b'{"id": 1}',))
+    worker.start()
+    worker.join()
+    assert len(transport._connections) == 1
+    transport.post(b'{"id": 2}')
+    assert list(transport._connections) == [threading.get_ident()]